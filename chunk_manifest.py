@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Run manifest of the parallel analysis scripts, records the status of each chunk so a failed run can be resumed
+
+    python3 chunk_manifest.py create <manifest> <input_xlsx> <csv_file> <chunk_size> <num_chunks>
+        records the inputs and the chunk files of a new run, every chunk is pending
+    python3 chunk_manifest.py check <manifest> <input_xlsx> <csv_file>
+        prints "<chunk_size> <num_chunks>" if the run can be resumed (same inputs, chunk files unchanged)
+    python3 chunk_manifest.py pending <manifest>
+        prints the chunks to run: not completed yet, failed or whose output is missing
+    python3 chunk_manifest.py update <manifest>
+        records the chunk_<n>.exit files ("<exit code> <seconds>") written by the chunk runs
+    python3 chunk_manifest.py verify <manifest>
+        exits with an error if a chunk is not completed with a readable output
+"""
+
+import json
+import os
+import sys
+import zipfile
+
+from result_cache import file_digest
+
+MANIFEST_VERSION = 1
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(path, manifest):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def output_ok(chunk):
+    # xlsx files are zip archives, a truncated or missing output is not one
+    return os.path.exists(chunk['output']) and zipfile.is_zipfile(chunk['output'])
+
+
+def create(path, input_file, csv_file, chunk_size, num_chunks):
+    chunks = []
+    for i in range(1, num_chunks + 1):
+        chunk_file = f'chunk_{i}.xlsx'
+        chunks.append({'chunk': i, 'input': chunk_file, 'input_sha1': file_digest(chunk_file),
+                       'output': f'output_chunk_{i}.xlsx', 'status': 'pending', 'exit_code': None, 'seconds': None})
+    save(path, {'version': MANIFEST_VERSION, 'input': input_file, 'input_sha1': file_digest(input_file),
+                'csv_file': csv_file, 'csv_sha1': file_digest(csv_file), 'chunk_size': chunk_size,
+                'chunks': chunks})
+
+
+def check(path, input_file, csv_file):
+    """Return the reason why the run of the manifest can not be resumed, None if it can"""
+    if not os.path.exists(path):
+        return f'no run manifest {path}'
+    manifest = load(path)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return 'the run manifest was written by another version of the scripts'
+    if manifest['input'] != input_file or manifest['input_sha1'] != file_digest(input_file):
+        return f'{input_file} is not the list of the previous run'
+    if manifest['csv_file'] != csv_file or manifest['csv_sha1'] != file_digest(csv_file):
+        return f'{csv_file} is not the CBX list of the previous run'
+    for chunk in manifest['chunks']:
+        if not os.path.exists(chunk['input']) or file_digest(chunk['input']) != chunk['input_sha1']:
+            return f'{chunk["input"]} is missing or changed'
+    return None
+
+
+def update(path):
+    manifest = load(path)
+    for chunk in manifest['chunks']:
+        exit_file = f'chunk_{chunk["chunk"]}.exit'
+        if not os.path.exists(exit_file):
+            continue
+        with open(exit_file, 'r', encoding='utf-8') as f:
+            exit_code, seconds = (int(x) for x in f.read().split())
+        os.remove(exit_file)
+        chunk['exit_code'] = exit_code
+        chunk['seconds'] = seconds
+        chunk['status'] = 'completed' if exit_code == 0 and output_ok(chunk) else 'failed'
+    save(path, manifest)
+
+
+def incomplete_chunks(manifest):
+    return [chunk for chunk in manifest['chunks'] if chunk['status'] != 'completed' or not output_ok(chunk)]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'create' and len(sys.argv) == 7:
+        create(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]), int(sys.argv[6]))
+    elif command == 'check' and len(sys.argv) == 5:
+        reason = check(sys.argv[2], sys.argv[3], sys.argv[4])
+        if reason:
+            print(f'Can not resume: {reason}', file=sys.stderr)
+            sys.exit(1)
+        manifest = load(sys.argv[2])
+        print(f'{manifest["chunk_size"]} {len(manifest["chunks"])}')
+    elif command == 'pending' and len(sys.argv) == 3:
+        for chunk in incomplete_chunks(load(sys.argv[2])):
+            print(chunk['chunk'])
+    elif command == 'update' and len(sys.argv) == 3:
+        update(sys.argv[2])
+    elif command == 'verify' and len(sys.argv) == 3:
+        manifest = load(sys.argv[2])
+        incomplete = incomplete_chunks(manifest)
+        for chunk in incomplete:
+            print(f'Chunk {chunk["chunk"]} is {chunk["status"]} (exit code {chunk["exit_code"]}, '
+                  f'output {chunk["output"]})', file=sys.stderr)
+        if incomplete:
+            sys.exit(1)
+        print(f'All {len(manifest["chunks"])} chunks completed')
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import gzip
+import importlib.util
+import lzma
+import os
+
+# compressed input files are detected by their extension and decompressed while they are read
+COMPRESSED_EXTENSIONS = ('.gz', '.xz', '.zst')
+
+
+def compression(path):
+    """Return the compression extension of path ('.gz', '.xz' or '.zst'), '' for an uncompressed file"""
+    extension = os.path.splitext(path)[1].lower()
+    return extension if extension in COMPRESSED_EXTENSIONS else ''
+
+
+def uncompressed_name(path):
+    """Return path without its compression extension (list.csv.gz -> list.csv)"""
+    return os.path.splitext(path)[0] if compression(path) else path
+
+
+def zstandard_available():
+    return importlib.util.find_spec('zstandard') is not None
+
+
+def open_text(path, encoding, newline=None):
+    """Open a text file for reading, decompressing it on the fly when it is compressed"""
+    extension = compression(path)
+    if extension == '.gz':
+        return gzip.open(path, 'rt', encoding=encoding, newline=newline)
+    if extension == '.xz':
+        return lzma.open(path, 'rt', encoding=encoding, newline=newline)
+    if extension == '.zst':
+        import zstandard
+        return zstandard.open(path, 'rt', encoding=encoding, newline=newline)
+    return open(path, 'r', encoding=encoding, newline=newline)
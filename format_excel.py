@@ -4,18 +4,24 @@ Enhanced Excel Formatter for Parallel Processing Results
 Only applies formatting (styles, tables, filters, column widths) - does NOT modify data
 """
 
+import os
 import openpyxl
 from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment
+from sheet_output import load_sheet_directory
 
 def apply_excel_formatting(input_file, output_file):
     """Apply Excel formatting (tables, styles, filters, column widths) to existing workbook"""
     
     print(f"Applying Excel formatting to {input_file} -> {output_file}")
     
-    # Load the existing workbook (already has all sheets with data)
-    wb = openpyxl.load_workbook(input_file)
+    # Load the existing workbook (already has all sheets with data), or build it from the sheet files written by
+    # main.py --output_format csv/parquet/jsonl
+    if os.path.isdir(input_file):
+        wb = load_sheet_directory(input_file, openpyxl.Workbook())
+    else:
+        wb = openpyxl.load_workbook(input_file)
     
     # Get all sheets
     sheets = wb.worksheets
@@ -125,7 +131,7 @@ def main():
     import sys
     
     if len(sys.argv) != 3:
-        print("Usage: python3 format_excel.py <input_file> <output_file>")
+        print("Usage: python3 format_excel.py <input_file or sheet directory> <output_file>")
         sys.exit(1)
     
     input_file = sys.argv[1]
@@ -1,80 +1,26 @@
 import argparse
 import csv
-import re
+import itertools
+import os
+import time
 import openpyxl
 from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment
-from fuzzywuzzy import fuzz
-from datetime import datetime, timedelta
-from convertTimeZone import convertFromIANATimezone
-
-CBX_DEFAULT_STANDARD_SUBSCRIPTION = 803
-CBX_HEADER_LENGTH = 28
-# noinspection SpellCheckingInspection
-CBX_ID, CBX_COMPANY_FR, CBX_COMPANY_EN, CBX_COMPANY_OLD, CBX_ADDRESS, CBX_CITY, CBX_STATE, \
-    CBX_COUNTRY, CBX_ZIP, CBX_FISTNAME, CBX_LASTNAME, CBX_EMAIL, CBX_EXPIRATION_DATE, CBX_REGISTRATION_STATUS, \
-    CBX_SUSPENDED, CBX_MODULES, CBX_ACCESS_MODES, CBX_ACCOUNT_TYPE, CBX_SUB_PRICE_CAD, CBX_EMPL_PRICE_CAD,\
-    CBX_SUB_PRICE_USD, CBX_EMPL_PRICE_USD, CBX_HIRING_CLIENT_NAMES, \
-    CBX_HIRING_CLIENT_IDS, CBX_HIRING_CLIENT_QSTATUS, CBX_PARENTS, CBX_ASSESSMENT_LEVEL, CBX_IS_NEW_PRODUCT = range(CBX_HEADER_LENGTH)
-
-HC_HEADER_LENGTH = 41
-HC_COMPANY, HC_FIRSTNAME, HC_LASTNAME, HC_EMAIL, HC_CONTACT_PHONE, HC_CONTACT_LANGUAGE, HC_STREET, HC_CITY, \
-    HC_STATE, HC_COUNTRY, HC_ZIP, HC_CATEGORY, HC_DESCRIPTION, HC_PHONE, HC_EXTENSION, HC_FAX,  HC_WEBSITE,\
-    HC_LANGUAGE, HC_IS_TAKE_OVER, HC_TAKEOVER_QUALIFICATION_DATE, HC_TAKEOVER_QF_STATUS, \
-    HC_PROJECT_NAME, HC_QUESTIONNAIRE_NAME, HC_QUESTIONNAIRE_ID, HC_PRICING_GROUP_ID, HC_PRICING_GROUP_CODE, \
-    HC_HIRING_CLIENT_NAME, HC_HIRING_CLIENT_ID, HC_IS_ASSOCIATION_FEE, HC_BASE_SUBSCRIPTION_FEE, \
-    HC_CONTACT_CURRENCY, HC_AGENT_IN_CHARGE_ID, HC_TAKEOVER_FOLLOW_UP_DATE, HC_TAKEOVER_RENEWAL_DATE, \
-    HC_INFORMATION_SHARED, HC_CONTACT_TIMEZONE, HC_DO_NOT_MATCH, HC_FORCE_CBX_ID, HC_AMBIGUOUS, \
-    HC_CONTRACTORCHECK_ACCOUNT, HC_ASSESSMENT_LEVEL \
-    = range(HC_HEADER_LENGTH)
-
-SUPPORTED_CURRENCIES = ('CAD', 'USD')
-
-assessment_levels = {
-    "gold": 2,
-    "silver": 2,
-    "bronze" : 1,
-    "level3": 2, 
-    "level2": 2,
-    "level1": 1,
-    "3":2,
-    "2":2,
-    "1":1
-}
-
-# Used in order to switch code and id in data to import
-rd_pricing_group_id_col = -1
-rd_pricing_group_code_col = -1
-
-# noinspection SpellCheckingInspection
-cbx_headers = ['id', 'name_fr', 'name_en', 'old_names', 'address', 'city', 'state', 'country', 'postal_code',
-               'first_name', 'last_name', 'email', 'cbx_expiration_date', 'registration_code', 'suspended',
-               'modules', 'access_modes', 'code', 'subscription_price_cad', 'employee_price_cad',
-               'subscription_price_usd', 'employee_price_usd', 'hiring_client_names',
-               'hiring_client_ids', 'hiring_client_qstatus', 'parents', 'assessment_level', 'new_product']
-
-# noinspection SpellCheckingInspection
-hiring_client_headers = ['contractor_name', 'contact_first_name', 'contact_last_name', 'contact_email', 'contact_phone',
-              'contact_language', 'address', 'city', 'province_state_iso2', 'country_iso2',
-              'postal_code', 'category', 'description', 'phone', 'extension', 'fax', 'website', 'language',
-              'is_take_over', 'qualification_expiration_date',
-              'qualification_status', 'batch', 'questionnaire_name', 'questionnaire_id',
-              'pricing_group_id', 'pricing_group_code', 'hiring_client_name', 'hiring_client_id', 'is_association_fee',
-              'base_subscription_fee', 'contact_currency', 'agent_in_charge_id', 'take_over_follow-up_date',
-              'renewal_date', 'information_shared', 'contact_timezone', 'do_not_match',
-              'force_cbx_id', 'ambiguous', 'contractorcheck_account', 'assessment_level']
-
-# noinspection SpellCheckingInspection
-analysis_headers = ['cbx_id', 'hc_contractor_summary', 'analysis','cbx_contractor', 'cbx_street', 'cbx_city', 'cbx_state', 'cbx_zip', 'cbx_country',
-                    'cbx_expiration_date', 'registration_status', 'suspended', 'cbx_email',
-                    'cbx_first_name', 'cbx_last_name', 'modules', 'cbx_account_type',
-                    'cbx_subscription_fee', 'cbx_employee_price', 'parents', 'previous',
-                    'hiring_client_names', 'hiring_client_count',
-                    'is_in_relationship', 'is_qualified', 'ratio_company', 'ratio_address',
-                    'contact_match', 'cbx_assessment_level', 'new_product', 'generic_domain', 'match_count', 'match_count_with_hc',
-                    'is_subscription_upgrade', 'upgrade_price', 'prorated_upgrade_price', 'create_in_cbx',
-                    'action', 'index']
+from datetime import datetime
+from matching import ACTIONS, BASE_GENERIC_DOMAIN, HC_COMPANY, HC_DO_NOT_MATCH, HC_EMAIL, \
+    HC_FORCE_CBX_ID, HC_HEADER_LENGTH, HC_HIRING_CLIENT_NAME, HC_STREET, HC_ZIP, HC_COUNTRY, RULE_PROFILES, \
+    MatchConfig, MatchExplanation, Matcher, analysis_headers, cbx_headers, hiring_client_headers, normalize_hc_row, \
+    parse_hc_email
+from compressed_input import compression, open_text, uncompressed_name, zstandard_available
+from mapped_csv import MappedCsv
+from pipeline import Pipeline
+from prepared_cbx import PREPARED_FORMAT_VERSION, PreparedCbxList, is_prepared_cbx_list
+from result_cache import ResultCache, file_digest
+from run_metrics import RunMetrics, output_bytes
+from sample_estimate import estimate_counts, project_seconds, stratified_sample
+from sheet_output import OUTPUT_FORMATS, TableOutput, parquet_available
+from spill_store import MemoryBudget, SpillList, SpilledOutput, consume, write_streamed_xlsx
 
 rd_headers = ['contractor_name', 'contact_first_name', 'contact_last_name', 'contact_email', 'contact_phone',
               'contact_language', 'address', 'city', 'province_state_iso2', 'country_iso2',
@@ -92,25 +38,37 @@ hubspot_headers = ['contractor_name', 'contact_first_name', 'contact_last_name',
               'questionnaire_id', 'hiring_client_name', 'hiring_client_id', 'action']
 
 
+sweep_headers = ['min_company_match_ratio', 'min_address_match_ratio']
+sweep_headers.extend(ACTIONS)
+sweep_headers.append('changed_actions')
+
+sweep_changes_headers = ['min_company_match_ratio', 'min_address_match_ratio', 'index', 'contractor_name', 'action',
+                         'sweep_action']
+
+sample_headers = ['action', 'sample_rows', 'estimated_rows', 'estimated_rows_low', 'estimated_rows_high']
+
+sample_strata_headers = ['country', 'generic_email', 'rows', 'sample_rows', 'seconds_per_row']
+
+# seed of the --sample random sample, the same list gives the same sample
+SAMPLE_SEED = 0
+
 metadata_headers = ['metadata_x', 'metadata_y', 'metadata_z', '...']
 
-# noinspection SpellCheckingInspection
-BASE_GENERIC_DOMAIN = ['yahoo.ca', 'yahoo.com', 'hotmail.com', 'gmail.com', 'outlook.com',
-                       'bell.com', 'bell.ca', 'videotron.ca', 'eastlink.ca', 'kos.net', 'bellnet.ca', 'sasktel.net',
-                       'aol.com', 'tlb.sympatico.ca', 'sogetel.net', 'cgocable.ca',
-                       'hotmail.ca', 'live.ca', 'icloud.com', 'hotmail.fr', 'yahoo.com', 'outlook.fr', 'msn.com',
-                       'globetrotter.net', 'live.com', 'sympatico.ca', 'live.fr', 'yahoo.fr', 'telus.net',
-                       'shaw.ca', 'me.com', 'bell.net', 'cablevision.qc.ca', 'live.ca', 'tlb.sympatico.ca',
-                       '', 'videotron.qc.ca', 'ivic.qc.ca', 'qc.aira.com', 'canada.ca', 'axion.ca', 'bellsouth.net', 
-                       'telusplanet.net','rogers.com', 'mymts.net', 'nb.aibn.com', 'on.aibn.com', 'live.be', 'nbnet.nb.ca',
-                       'execulink.com', 'bellaliant.com', 'nf.aibn.com', 'clintar.com', 'pathcom.com', 'oricom.ca', 'mts.net',
-                       'xplornet.com', 'mcsnet.ca', 'att.net', 'ymail.com', 'mail.com', 'bellaliant.net', 'ns.sympatico.ca', 
-                       'ns.aliantzinc.ca', 'mnsi.net']
-# noinspection SpellCheckingInspection
-BASE_GENERIC_COMPANY_NAME_WORDS = ['construction', 'contracting', 'industriel', 'industriels', 'service',
-                                   'services', 'inc', 'limited', 'ltd', 'ltee', 'ltée', 'co', 'industrial',
-                                   'solutions', 'llc', 'enterprises', 'systems', 'industries',
-                                   'technologies', 'company', 'corporation', 'installations', 'enr']
+# delimiter of the hc lists read as text files, other hc lists are read as excel workbooks
+HC_LIST_DELIMITERS = {'.csv': ',', '.tsv': '\t'}
+
+# per list columns of a --batch file and the option they replace, options changing how the cbx list is loaded
+# are the same for all the lists
+BATCH_OPTIONS = {'hc_list_sheet_name': 'hc_list_sheet_name', 'hc_list_offset': 'hc_list_offset',
+                 'hc_list_encoding': 'hc_encoding', 'min_company_match_ratio': 'ratio_company',
+                 'min_address_match_ratio': 'ratio_address', 'additional_generic_domain': 'additional_generic_domain',
+                 'generic_domain_min_count': 'generic_domain_min_count',
+                 'generic_domain_min_share': 'generic_domain_min_share', 'output_format': 'output_format',
+                 'explain_rows': 'explain_rows', 'metrics_file': 'metrics_file', 'result_cache': 'result_cache'}
+
+# rows waiting between two stages of the --pipeline mode
+PIPELINE_QUEUE_SIZE = 100
+
 
 
 def chunks(lst, n):
@@ -126,24 +84,21 @@ hiring_client_headers_text = '\n'.join([', '.join(x) for x in list(chunks(hiring
 analysis_headers_text = '\n'.join([', '.join(x) for x in list(chunks(analysis_headers, 5))])
 existing_contractors_text = '\n'.join([', '.join(x) for x in list(chunks(existing_contractors_headers, 5))])
 
-if len(hiring_client_headers) != HC_HEADER_LENGTH:
-    raise AssertionError('hc header inconsistencies')
-
-if len(cbx_headers) != CBX_HEADER_LENGTH:
-    raise AssertionError('cbx header inconsistencies')
-
 # define commandline parser
 parser = argparse.ArgumentParser(
     description='Tool to match contractor list provided by hiring clients to business units in CBX, '
                 'all input/output files must be in the current directory',
     formatter_class=argparse.RawTextHelpFormatter)
 parser.add_argument('cbx_list',
-                    help=f'csv DB export file of business units with the following columns:\n{cbx_headers_text}\n\n')
+                    help=f'csv DB export file of business units with the following columns:\n{cbx_headers_text}\n'
+                         f'(can be compressed: .csv.gz, .csv.xz or .csv.zst) or the same list prepared once by'
+                         f' prepare_cbx_list.py\n\n')
 
-parser.add_argument('hc_list',
-                    help=f'xlsx file of the hiring client contractors and the '
+parser.add_argument('hc_list', nargs='?',
+                    help=f'xlsx, csv or tsv file (csv and tsv can be compressed: .gz, .xz or .zst) of the hiring'
+                         f' client contractors and the '
                          f'following columns:\n{hiring_client_headers_text}\n\n')
-parser.add_argument('output',
+parser.add_argument('output', nargs='?',
                     help=f'the xlsx file to be created with the hc_list columns and the following analysis columns:'
                          f'\n{analysis_headers_text}\n\n**Please note that metadata columns from the'
                          f' hc file are moved after the analysis data')
@@ -171,6 +126,16 @@ parser.add_argument('--additional_generic_domain', dest='additional_generic_doma
                     default='',
                     help='list of domains to ignore separated by the list separator (default separator is ;)')
 
+parser.add_argument('--generic_domain_min_count', dest='generic_domain_min_count', action='store',
+                    default=0,
+                    help='email domains of at least this number of business units in the cbx list are ignored like'
+                         ' the generic domains, 0 to disable (default 0)')
+
+parser.add_argument('--generic_domain_min_share', dest='generic_domain_min_share', action='store',
+                    default=0,
+                    help='email domains of at least this share of the business units in the cbx list (Ex: 0.01 for'
+                         ' 1%%) are ignored like the generic domains, 0 to disable (default 0)')
+
 parser.add_argument('--additional_generic_name_word', dest='additional_generic_name_word', action='store',
                     default='',
                     help='list of generic words in company name to ignore separated by the list separator'
@@ -180,169 +145,95 @@ parser.add_argument('--cbx_list_encoding', dest='cbx_encoding', action='store',
                     default='utf-8-sig',
                     help='Encoding for the cbx list (default: utf-8-sig)')
 
+parser.add_argument('--hc_list_encoding', dest='hc_encoding', action='store',
+                    default='utf-8-sig',
+                    help='Encoding for a csv or tsv hc list (default: utf-8-sig)')
+
 parser.add_argument('--list_separator', dest='list_separator', action='store',
                     default=';',
                     help='string separator used for lists (default: ;)')
 
-parser.add_argument('--no_headers', dest='no_headers', action='store_true',
-                    help='to indicate that input files have no headers')
-
-parser.add_argument('--ignore_warnings', dest='ignore_warnings', action='store_true',
-                    help='to ignore data consistency checks and run anyway...')
-
-args = parser.parse_args()
-GENERIC_DOMAIN = BASE_GENERIC_DOMAIN + args.additional_generic_domain.split(args.list_separator)
-GENERIC_COMPANY_NAME_WORDS = BASE_GENERIC_COMPANY_NAME_WORDS + \
-                             args.additional_generic_name_word.split(args.list_separator)
-
+parser.add_argument('--mmap_cbx_list', dest='mmap_cbx_list', action='store_true',
+                    help='memory-map the cbx list and only keep the columns used for matching in memory, the other'
+                         ' columns are read again from the file for the reported matches (for very large lists,'
+                         ' the encoding must be ascii compatible like utf-8)')
+
+parser.add_argument('--pipeline', dest='pipeline', action='store_true',
+                    help='read the cbx list, read the hc list, match and write the rows in parallel stages instead'
+                         ' of one after the other, the queue depths and wait times of the stages are printed at the'
+                         ' end to show the bottleneck')
+
+parser.add_argument('--max_memory', dest='max_memory', action='store', type=int,
+                    default=0,
+                    help='memory budget of the run in MB: the cbx list is memory-mapped (see --mmap_cbx_list), the'
+                         ' analysed rows and the sheets are moved to temporary files once the process uses more than'
+                         ' the budget and the workbook is written from them at the end without holding it in memory'
+                         ' (the output is only saved at the end of the run)')
+
+parser.add_argument('--output_format', dest='output_format', action='store', choices=OUTPUT_FORMATS,
+                    default='xlsx',
+                    help='format of the analysis: an excel workbook (default) or a directory named after the output'
+                         ' file with one csv, parquet or json lines file per sheet, same columns as the workbook'
+                         ' sheets (parquet requires pyarrow), use format_excel.py to build the workbook afterwards')
+
+parser.add_argument('--explain_rows', dest='explain_rows', action='store',
+                    default='',
+                    help='list of hc rows (index column of the analysis) separated by the list separator, the number'
+                         ' of business units considered, scored, pruned and accepted by each step of their matching,'
+                         ' the time spent and their top matches are printed (default separator is ;)')
 
-def smart_boolean(bool_data):
-    if isinstance(bool_data, str):
-        bool_data = bool_data.lower().strip()
-        return True if bool_data in ('true', '=true', 'yes', 'vraie', '=vraie', '1') else False
-    else:
-        return bool(bool_data)
+parser.add_argument('--metrics_file', dest='metrics_file', action='store',
+                    default=None,
+                    help='write the metrics of the run (rows loaded and analysed, pairs scored, rows per action,'
+                         ' durations, peak memory, output size) in <metrics_file>.json and <metrics_file>.prom'
+                         ' (prometheus text format)')
 
+parser.add_argument('--batch', dest='batch', action='store',
+                    default='',
+                    help='csv file of hc lists to analyse one after the other against the cbx list loaded once, with'
+                         ' the hc_list and output columns and optional per list columns named after the options: '
+                         + ', '.join(BATCH_OPTIONS) + ' (empty values keep the command line value), hc_list and'
+                         ' output are not given on the command line with a batch')
 
-# noinspection PyShadowingNames
-def add_analysis_data(hc_row, cbx_row, ratio_company=None, ratio_address=None, contact_match=None):
-    cbx_company = cbx_row[CBX_COMPANY_FR] if cbx_row[CBX_COMPANY_FR] else cbx_row[CBX_COMPANY_EN]
-    print('   --> ', cbx_company, hc_email, cbx_row[CBX_ID], ratio_company, ratio_address, contact_match)
-    import string
-    def norm_name(name):
-        if not name:
-            return ''
-        # Remove punctuation, lowercase, and strip whitespace
-        return str(name).translate(str.maketrans('', '', string.punctuation)).strip().lower()
-
-    hiring_clients_list = [norm_name(x) for x in cbx_row[CBX_HIRING_CLIENT_NAMES].split(args.list_separator)]
-    hiring_clients_qstatus = cbx_row[CBX_HIRING_CLIENT_QSTATUS].split(args.list_separator)
-    hc_name_norm = norm_name(hc_row[HC_HIRING_CLIENT_NAME])
-    hc_count = len(hiring_clients_list) if cbx_row[CBX_HIRING_CLIENT_NAMES] else 0
-    is_in_relationship = hc_name_norm in hiring_clients_list and hc_name_norm != ''
-    is_qualified = False
-    matched_qstatus = None
-    sub_price_usd = float(cbx_row[CBX_SUB_PRICE_USD]) if cbx_row[CBX_SUB_PRICE_USD] else 0.0
-    employee_price_usd = float(cbx_row[CBX_EMPL_PRICE_USD]) if cbx_row[CBX_EMPL_PRICE_USD] else 0.0
-    sub_price_cad = float(cbx_row[CBX_SUB_PRICE_CAD]) if cbx_row[CBX_SUB_PRICE_CAD] else 0.0
-    employee_price_cad = float(cbx_row[CBX_EMPL_PRICE_CAD]) if cbx_row[CBX_EMPL_PRICE_CAD] else 0.0
-    hiring_client_contractor_summary = f'{hc_row[HC_COMPANY]}, {hc_row[HC_STREET]}, {hc_row[HC_CITY]}, {hc_row[HC_STATE]}, {hc_row[HC_COUNTRY]}, {hc_row[HC_ZIP]}, {hc_row[HC_EMAIL]}, {hc_row[HC_FIRSTNAME]} {hc_row[HC_LASTNAME]}'
-
-    if hc_row[HC_CONTACT_CURRENCY] != '' and hc_row[HC_CONTACT_CURRENCY] not in SUPPORTED_CURRENCIES:
-        raise AssertionError(f'Invalid currency: {hc_row[HC_CONTACT_CURRENCY]}, must be in {SUPPORTED_CURRENCIES}')
-    for idx, val in enumerate(hiring_clients_list):
-        if val == hc_name_norm and idx < len(hiring_clients_qstatus):
-            qstatus = hiring_clients_qstatus[idx].strip().lower()
-            matched_qstatus = qstatus
-            if qstatus == 'validated':
-                is_qualified = True
-            break
-    try:
-        expiration_date = datetime.strptime(cbx_row[CBX_EXPIRATION_DATE],
-                                        "%d/%m/%y") if cbx_row[CBX_EXPIRATION_DATE] else None
-    except ValueError:
-        expiration_date = datetime.strptime(cbx_row[CBX_EXPIRATION_DATE],
-                                        "%d/%m/%Y") if cbx_row[CBX_EXPIRATION_DATE] else None
-
-    return {'cbx_id': int(cbx_row[CBX_ID]), 'hc_contractor_summary': hiring_client_contractor_summary, 'analysis':'', 'company': cbx_company, 'address': cbx_row[CBX_ADDRESS],
-        'city': cbx_row[CBX_CITY], 'state': cbx_row[CBX_STATE], 'zip': cbx_row[CBX_ZIP],
-        'country': cbx_row[CBX_COUNTRY], 'expiration_date': expiration_date,
-        'registration_status': cbx_row[CBX_REGISTRATION_STATUS],
-        'suspended': cbx_row[CBX_SUSPENDED], 'email': cbx_row[CBX_EMAIL], 'first_name': cbx_row[CBX_FISTNAME],
-        'last_name': cbx_row[CBX_LASTNAME], 'modules': cbx_row[CBX_MODULES],
-        'account_type': cbx_row[CBX_ACCOUNT_TYPE],
-        'subscription_price': sub_price_cad if hc_row[HC_CONTACT_CURRENCY] == "CAD" else sub_price_usd,
-        'employee_price': employee_price_cad if hc_row[HC_CONTACT_CURRENCY] == "CAD" else employee_price_usd,
-        'parents': cbx_row[CBX_PARENTS], 'previous': cbx_row[CBX_COMPANY_OLD],
-        'hiring_client_names': cbx_row[CBX_HIRING_CLIENT_NAMES], 'hiring_client_count': hc_count,
-        'is_in_relationship': is_in_relationship, 'is_qualified': is_qualified,
-        'matched_qstatus': matched_qstatus,
-        'ratio_company': ratio_company, 'ratio_address': ratio_address, 'contact_match': contact_match, 
-        'cbx_assessment_level': cbx_row[CBX_ASSESSMENT_LEVEL],
-        'new_product': cbx_row[CBX_IS_NEW_PRODUCT]
-        }
-
-
-def core_mandatory_provided(hcd):
-    mandatory_fields = (HC_COMPANY, HC_FIRSTNAME, HC_LASTNAME, HC_EMAIL, HC_CONTACT_PHONE,
-                        HC_STREET, HC_CITY, HC_STATE, HC_COUNTRY, HC_ZIP)
-    country = hcd[HC_COUNTRY].strip().lower() if isinstance(hcd[HC_COUNTRY], str) else hcd[HC_COUNTRY]
-    for field in mandatory_fields:
-        f_value = hcd[field].strip() if isinstance(hcd[field], str) else hcd[field]
-        if f_value == "":
-            if field == HC_STATE and country not in ('ca', 'us'):
-                pass
-            else:
-                return False
-    return True
+parser.add_argument('--result_cache', dest='result_cache', action='store',
+                    default=None,
+                    help='json file used to reuse the matches of unchanged hc rows from a previous run against the'
+                         ' same cbx list and match parameters (default: no cache)')
 
+parser.add_argument('--sweep_company_ratios', dest='sweep_company_ratios', action='store',
+                    default='',
+                    help='list of company match ratios separated by the list separator to evaluate in a threshold'
+                         ' sweep, the hc list is scored once and the output file is a report of the actions'
+                         ' for each combination of company and address ratios instead of the analysis')
 
-# noinspection PyShadowingNames
-def action(hc_data, cbx_data, create, subscription_update, expiration_date, is_qualified, ignore):
-    if create:
-        if smart_boolean(hc_data[HC_IS_TAKE_OVER]):
-            return 'activation_link'
-        else:
-            if hc_data[HC_AMBIGUOUS]:
-                return 'ambiguous_onboarding'
-            elif core_mandatory_provided(hc_data):
-                return 'onboarding'
-            else:
-                return 'missing_info'
-    else:
-        reg_status = cbx_data['registration_status']
-        if smart_boolean(hc_data[HC_IS_TAKE_OVER]):
-            if reg_status == 'Suspended':
-                return 'restore_suspended'
-            elif reg_status == 'Active':
-                return 'add_questionnaire'
-            elif reg_status == 'Non Member':
-                return 'activation_link'
-            else:
-                print(f'WARNING: invalid registration status {hc_data[CBX_REGISTRATION_STATUS]}')
-                if not ignore:
-                    exit(-1)
-        else:
-            if reg_status == 'Active':
-                if cbx_data['is_in_relationship']:
-                    qstatus = cbx_data.get('matched_qstatus', None)
-                    if qstatus == 'validated':
-                        return 'already_qualified'
-                    elif qstatus in ('pending', 'expired', 'conditional', 'refused'):
-                        return 'follow_up_qualification'
-                    else:
-                        # If qstatus is missing or unknown, fallback to previous logic
-                        if is_qualified:
-                            return 'already_qualified'
-                        else:
-                            return 'follow_up_qualification'
-                else:
-                    if subscription_update:
-                        return 'subscription_upgrade'
-                    elif hc_data[HC_IS_ASSOCIATION_FEE] and not cbx_data['is_in_relationship']:
-                        # Association fee only if renewal > 60 days, else add questionnaire
-                        if expiration_date:
-                            in_60_days = datetime.now() + timedelta(days=60)
-                            if expiration_date > in_60_days:
-                                return 'association_fee'
-                            else:
-                                return 'add_questionnaire'
-                        else:
-                            return 'association_fee'
-                    else:
-                        return 'add_questionnaire'
-            elif reg_status == 'Suspended':
-                return 'restore_suspended'
-            elif reg_status in ('Non Member', '', None):
-                return 're_onboarding'
-            else:
-                raise AssertionError(f'invalid registration status: {reg_status}')
+parser.add_argument('--sweep_address_ratios', dest='sweep_address_ratios', action='store',
+                    default='',
+                    help='list of address match ratios separated by the list separator to evaluate in a threshold'
+                         ' sweep (see --sweep_company_ratios)')
+
+parser.add_argument('--sample', dest='sample', action='store', type=int,
+                    default=0,
+                    help='analyse a random sample of this number of hc rows, stratified by country and generic or'
+                         ' corporate email, to estimate the analysis of the whole list: the output file is a report'
+                         ' of the estimated rows per action with their 95%% confidence interval (estimate sheet),'
+                         ' the strata (strata sheet) and the projected duration of the full analysis (summary'
+                         ' sheet), 0 (default) analyses the whole list')
+
+parser.add_argument('--rule_profile', dest='rule_profile', action='store',
+                    default='standard', choices=sorted(RULE_PROFILES),
+                    help='business rules of the analysis: standard or cc_migration (the rules of the cc migration'
+                         ' runs, same as running main_cc_migration_edition.py) (default: standard)')
+
+parser.add_argument('--exact_name_shortcut', dest='exact_name_shortcut', action='store_true',
+                    help='when a business unit has the same company name (once cleaned) and postal code as a hc'
+                         ' row, only score the business units with that exact name instead of scanning all of them'
+                         ' (faster, but other similar business units are not listed)')
 
+parser.add_argument('--no_headers', dest='no_headers', action='store_true',
+                    help='to indicate that input files have no headers')
 
-def remove_generics(company_name):
-    for word in GENERIC_COMPANY_NAME_WORDS:
-        company_name = re.sub(r'\b' + word + r'\b', '', company_name)
-    return company_name
+parser.add_argument('--ignore_warnings', dest='ignore_warnings', action='store_true',
+                    help='to ignore data consistency checks and run anyway...')
 
 
 # noinspection PyShadowingNames
@@ -355,150 +246,370 @@ def check_headers(headers, standards, ignore):
                 exit(-1)
 
 
-def clean_company_name(name):
-    name = name.lower().replace('.', '').replace(',', '').strip()
-    name = re.sub(r"\([^()]*\)", "", name)
-    name = remove_generics(name)
-    return name
+def write_sweep_report(summary, changes, output_file):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'sweep'
+    ws_changes = wb.create_sheet(title='action_changes')
+    for sheet, headers, rows in ((ws, sweep_headers, summary), (ws_changes, sweep_changes_headers, changes)):
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(row)
+    wb.save(filename=output_file)
+
+
+def write_sample_report(estimates, strata_rows, summary, output_file):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'estimate'
+    ws_strata = wb.create_sheet(title='strata')
+    ws_summary = wb.create_sheet(title='summary')
+    for sheet, headers, rows in ((ws, sample_headers, [[action, *values] for action, values in estimates.items()]),
+                                 (ws_strata, sample_strata_headers, strata_rows),
+                                 (ws_summary, ['name', 'value'], summary)):
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(row)
+    wb.save(filename=output_file)
+
+
+def estimate_actions(matcher, hc_data, size, cbx_load_seconds, output_file):
+    """Analyse a stratified random sample of hc_data and write the estimated actions of the whole list"""
+    strata = {}
+    for index, hc_row in enumerate(hc_data):
+        hc_email, hc_domain = parse_hc_email(hc_row[HC_EMAIL])
+        key = (str(hc_row[HC_COUNTRY]).strip().upper(), hc_domain in matcher.config.generic_domains)
+        strata.setdefault(key, []).append(index)
+    sample = stratified_sample(strata, size, SAMPLE_SEED)
+    sample_size = sum(len(indexes) for indexes in sample.values())
+    print(f'Sampled {sample_size} of {len(hc_data)} rows in {len(sample)} of {len(strata)} strata')
+    actions = {}
+    seconds = {}
+    for key, indexes in sample.items():
+        for index in indexes:
+            start = time.perf_counter()
+            actions.setdefault(key, []).append(matcher.match_row(hc_data[index])[-1])
+            seconds.setdefault(key, []).append(time.perf_counter() - start)
+            print(f'{sum(len(values) for values in actions.values())} of {sample_size}')
+    stratum_sizes = {key: len(indexes) for key, indexes in strata.items()}
+    estimates = estimate_counts(stratum_sizes, actions, ACTIONS)
+    for action, (sample_count, estimate, low, high) in estimates.items():
+        if estimate or sample_count:
+            print(f'{action}: {estimate} rows (95% interval {low} - {high}, {sample_count} in the sample)')
+    match_seconds = project_seconds(stratum_sizes, seconds)
+    print(f'Projected duration of the full analysis: {(cbx_load_seconds + match_seconds) / 60:.1f} minutes '
+          f'({cbx_load_seconds:.1f}s to load the cbx list, {match_seconds:.1f}s to match {len(hc_data)} rows, '
+          f'without writing the output)')
+    strata_rows = [[country, generic, stratum_sizes[(country, generic)], len(seconds.get((country, generic), [])),
+                    round(sum(seconds[(country, generic)]) / len(seconds[(country, generic)]), 3)
+                    if seconds.get((country, generic)) else None]
+                   for country, generic in sorted(strata)]
+    summary = [['hc_rows', len(hc_data)], ['sample_rows', sample_size],
+               ['cbx_load_seconds', round(cbx_load_seconds, 3)],
+               ['sample_match_seconds', round(sum(sum(values) for values in seconds.values()), 3)],
+               ['projected_match_seconds', round(match_seconds, 3)],
+               ['projected_seconds', round(cbx_load_seconds + match_seconds, 3)]]
+    write_sample_report(estimates, strata_rows, summary, output_file)
+
+
+def check_compression(path):
+    if compression(path) == '.zst' and not zstandard_available():
+        print(f'WARNING: zstandard is required to read {os.path.basename(path)}, install it with pip install zstandard')
+        exit(-1)
+
+
+def read_cbx_list(args, cbx_file):
+    """Return the business unit rows of the cbx list file, exit on data consistency warnings (unless ignored)"""
+    check_compression(cbx_file)
+    if args.mmap_cbx_list and compression(cbx_file):
+        print('The cbx list is compressed, it is read in memory (--mmap_cbx_list is ignored)')
+    if args.mmap_cbx_list and not compression(cbx_file):
+        cbx_data = MappedCsv(cbx_file, args.cbx_encoding).rows()
+    else:
+        # compressed lists are decompressed while they are parsed
+        with open_text(cbx_file, args.cbx_encoding) as cbx:
+            cbx_data = iter(list(csv.reader(cbx)))
+    first_row = next(cbx_data, [])
+    # check cbx db ata consistency
+    if first_row and len(first_row) != len(cbx_headers):
+        print(f'WARNING: got {len(first_row)} columns when expecting {len(cbx_headers)}')
+        if not args.ignore_warnings:
+            exit(-1)
+    if not args.no_headers:
+        headers = [x.lower().strip() for x in first_row]
+        check_headers(headers, cbx_headers, args.ignore_warnings)
+    elif first_row:
+        cbx_data = itertools.chain([first_row], cbx_data)
+    return cbx_data
 
 
-def parse_assessment_level(level):
-    if(level is None or (isinstance(level, int) and level > 0 and level < 4)):
-        return level
-    
-    if(level.lower() in assessment_levels):
-        return assessment_levels[level.lower()]
-    
-    return 0
+def open_result_cache(args, config, cbx_file, data_path):
+    if not args.result_cache:
+        return None
+    result_cache = ResultCache(data_path + args.result_cache, file_digest(cbx_file), config.identity(),
+                               (HC_COMPANY, HC_EMAIL, HC_STREET, HC_ZIP, HC_COUNTRY, HC_DO_NOT_MATCH,
+                                HC_FORCE_CBX_ID, HC_HIRING_CLIENT_NAME))
+    if result_cache.reset:
+        print(f'WARNING: cbx list or match parameters changed, result cache {args.result_cache} is reset')
+    return result_cache
 
-if __name__ == '__main__':
-    data_path = './data/'
-    cbx_file = data_path + args.cbx_list
-    hc_file = data_path + args.hc_list
-    output_file = data_path + args.output
 
-    # output parameters used
-    print(f'Starting at {datetime.now()}')
-    print(f'Reading CBX list: {args.cbx_list} [{args.cbx_encoding}]')
-    print(f'Reading HC list: {args.hc_list}')
-    print(f'Outputting results in: {args.output}')
-    print(f'contractor match ratio: {args.ratio_company}')
-    print(f'address match ratio: {args.ratio_address}')
-    print(f'list of generic domains:\n{BASE_GENERIC_DOMAIN}')
-    print(f'additional generic domain: {args.additional_generic_domain}')
-    # read data
-    cbx_data = []
-    hc_data = []
-    hc_row = []
+def load_matcher(args, config, cbx_file, result_cache=None):
+    """Read the cbx list (csv or prepared) and return its Matcher, exit on data consistency warnings (unless ignored)"""
     print('Reading Cognibox data file...')
-    with open(cbx_file, 'r', encoding=args.cbx_encoding) as cbx:
-        for row in csv.reader(cbx):
-            cbx_data.append(row)
-    # check cbx db ata consistency
-    if cbx_data and len(cbx_data[0]) != len(cbx_headers):
-        print(f'WARNING: got {len(cbx_data[0])} columns when expecting {len(cbx_headers)}')
-        if not args.ignore_warnings:
+    load_errors = None
+    if is_prepared_cbx_list(cbx_file):
+        # filtered, enriched and compacted once by prepare_cbx_list.py
+        prepared = PreparedCbxList(cbx_file)
+        if prepared.version != PREPARED_FORMAT_VERSION or prepared.identity != config.cbx_identity():
+            print(f'WARNING: {args.cbx_list} was prepared by another version or with another list separator,'
+                  f' generic name words or rule profile, prepare it again with prepare_cbx_list.py')
             exit(-1)
-    if not args.no_headers:
-        headers = cbx_data.pop(0)
-        headers = [x.lower().strip() for x in headers]
-        check_headers(headers, cbx_headers, args.ignore_warnings)
+        cbx_data = prepared.rows
+        load_errors = prepared.load_errors
+    else:
+        cbx_data = read_cbx_list(args, cbx_file)
     # for index, row in enumerate(cbx_data):
     #     access_modes = row[CBX_ACCESS_MODES].split(';')
     #     # only keep contractors on Non-member without any access mode (ignore training and hiring clients)
     #     if 'Contractor' not in access_modes and access_modes:
     #         cbx_data.pop(index)
-    print(f'Completed reading {len(cbx_data)} contractors.')
+    matcher = Matcher(cbx_data, config, result_cache, load_errors)
+    for cbx_id, error in matcher.load_errors:
+        print(f'WARNING: {error} for business unit {cbx_id}')
+    if matcher.load_errors and not args.ignore_warnings:
+        exit(-1)
+    print(f'Completed reading {len(matcher.cbx_data)} contractors ({len(matcher.relationship_index)} hiring clients).')
+    return matcher
+
+
+def read_hc_sheet(hc_sheet, row_offset, column_offset):
+    # start data retrieval at offset
+    for row in hc_sheet.iter_rows(min_row=row_offset+1, min_col=column_offset+1, values_only=True):
+        if not row or not row[0]:
+            continue
+        yield [value if value is not None else '' for value in row]
+
 
+def read_hc_text(hc_file, encoding, delimiter, row_offset, column_offset, max_column):
+    with open_text(hc_file, encoding, newline='') as hc:
+        for row in itertools.islice(csv.reader(hc, delimiter=delimiter), row_offset, None):
+            row = row[column_offset:]
+            if not row or not row[0]:
+                continue
+            # pad short rows like the empty cells of a sheet
+            row.extend([''] * (max_column - column_offset - len(row)))
+            yield row
+
+
+def open_hc_list(args, hc_file):
+    """Return the number of rows of the hc list (xlsx sheet, csv or tsv file) and an iterator of its rows (headers
+    included) as lists of values, exit if the list is too large (unless ignored)"""
     print('Reading hiring client data file...')
-    hc_wb = openpyxl.load_workbook(hc_file, read_only=True, data_only=True)
-    if args.hc_list_sheet_name:
-        hc_sheet = hc_wb.get_sheet_by_name(args.hc_list_sheet_name)
-    else:
-        hc_sheet = hc_wb.active
-    max_row = hc_sheet.max_row
-    max_column = hc_sheet.max_column
     row_offset = 0 if not args.hc_list_offset else int(args.hc_list_offset.split(',')[0])-1
     column_offset = 0 if not args.hc_list_offset else int(args.hc_list_offset.split(',')[1])-1
+    delimiter = HC_LIST_DELIMITERS.get(os.path.splitext(uncompressed_name(hc_file))[1].lower())
+    if delimiter:
+        check_compression(hc_file)
+        with open_text(hc_file, args.hc_encoding, newline='') as hc:
+            row_lengths = [len(row) for row in csv.reader(hc, delimiter=delimiter)]
+        max_row = len(row_lengths)
+        max_column = max(row_lengths, default=0)
+        hc_rows = read_hc_text(hc_file, args.hc_encoding, delimiter, row_offset, column_offset, max_column)
+    else:
+        hc_wb = openpyxl.load_workbook(hc_file, read_only=True, data_only=True)
+        if args.hc_list_sheet_name:
+            hc_sheet = hc_wb.get_sheet_by_name(args.hc_list_sheet_name)
+        else:
+            hc_sheet = hc_wb.active
+        max_row = hc_sheet.max_row
+        max_column = hc_sheet.max_column
+        hc_rows = read_hc_sheet(hc_sheet, row_offset, column_offset)
 
     if max_column > 250 or max_row > 10000:
         print(f'WARNING: File is large: {max_row} rows and {max_column}. must be less than 10000 and 250')
         if not args.ignore_warnings:
             exit(-1)
-    for row in hc_sheet.rows:
-        # start data retrieval at offset
-        while row_offset:
-            next(hc_sheet.rows)
-            row_offset -= 1
-        row = row[column_offset:]
-        # retrieve
-        if not row[0].value:
-            continue
-        hc_data.append([cell.value if cell.value is not None else '' for cell in row])
-    total = len(hc_data) - 1
-    metadata_indexes = []
+    return max_row, hc_rows
+
+
+def check_hc_headers(args, first_row):
+    """Check the first row of the hc list, return its headers (none with --no_headers)"""
     headers = []
-    rd_headers_mapping = []
-    hs_headers_mapping = []
-    existing_contractors_headers_mapping = []
     # check hc data consistency
-    if hc_data and len(hc_data[0]) < len(hiring_client_headers):
-        print(f'WARNING: got {len(hc_data[0])} columns when at least {len(hiring_client_headers)} is expected')
+    if first_row and len(first_row) < len(hiring_client_headers):
+        print(f'WARNING: got {len(first_row)} columns when at least {len(hiring_client_headers)} is expected')
         if not args.ignore_warnings:
             exit(-1)
     if not args.no_headers:
-        headers = hc_data.pop(0)
-        headers = [x.lower().strip() for x in headers]
+        headers = [x.lower().strip() for x in first_row]
         check_headers(headers, hiring_client_headers, args.ignore_warnings)
     else:
-        if hc_data and len(hc_data[0]) != len(hiring_client_headers):
-            print(f'WARNING: got {len(hc_data[0])} columns when {len(hiring_client_headers)} is exactly expected')
+        if first_row and len(first_row) != len(hiring_client_headers):
+            print(f'WARNING: got {len(first_row)} columns when {len(hiring_client_headers)} is exactly expected')
             if not args.ignore_warnings:
                 exit(-1)
+    return headers
+
+
+def prepare_hc_row(row, profile, ignore_warnings):
+    """Normalize a hc row in place, exit on its data consistency warnings (unless ignored)"""
     # checking currency integrity and strip characters from contact phone
+    for warning in normalize_hc_row(row, profile):
+        print(f'WARNING: {warning}')
+        if not ignore_warnings:
+            exit(-1)
+
+
+def analyse_hc_row(matcher, hc_row, index, metadata_indexes, explain_rows=()):
+    """Append the analysis columns and the index to hc_row and move its metadata columns at the end, return the
+    analysis columns. Rows whose index is in explain_rows print the explanation of their matching."""
+    if index+1 in explain_rows:
+        explain = MatchExplanation()
+        analysis = matcher.match_row(hc_row, explain)
+        print(f'Explaining row {index+1} ({hc_row[HC_COMPANY]}):\n{explain.report()}')
+    else:
+        analysis = matcher.match_row(hc_row)
+    hc_row.extend(analysis)
+    hc_row.append(index+1)
+    metadata_array = []
+    for md_index in metadata_indexes:
+        metadata_array.insert(0, hc_row.pop(md_index))
+    hc_row.extend(metadata_array)
+    return analysis
+
+
+def write_run_metrics(metrics, metrics_file, matcher, hc_data, action_column, output_file):
+    """Write the metrics of the analysis in <metrics_file>.json and <metrics_file>.prom"""
+    metrics.set('cbx_rows', len(matcher.cbx_data))
+    metrics.set('hc_rows', len(hc_data))
+    metrics.set('scored_pairs', matcher.search_stats['scored_pairs'])
+    metrics.set('candidate_pairs', matcher.search_stats['candidate_pairs'])
+    metrics.set('output_bytes', output_bytes(output_file))
+    metrics.set('detected_generic_domains', matcher.detected_generic_domains)
+    metrics.actions = dict.fromkeys(ACTIONS, 0)
     for row in hc_data:
-        if row[HC_COUNTRY].lower().strip() == 'ca':
-            if row[HC_CONTACT_CURRENCY].lower().strip() not in ('cad', ''):
-                print(f'WARNING: currency and country mismatch: {row[HC_CONTACT_CURRENCY]} and'
-                      f' "{row[HC_COUNTRY]}". Expected CAD in row {row}')
-                if not args.ignore_warnings:
-                    exit(-1)
-        elif row[HC_COUNTRY].lower().strip() != '':
-            if row[HC_CONTACT_CURRENCY].lower().strip() not in ('usd', ''):
-                print(f'WARNING: currency and country mismatch: {row[HC_CONTACT_CURRENCY]} and'
-                      f' "{row[HC_COUNTRY]}". Expected USD in row {row}')
-                if not args.ignore_warnings:
-                    exit(-1)
-        row[HC_EMAIL] = str(row[HC_EMAIL]).strip()
-        # correct and normalize phone number
-        extension = ''
-        if isinstance(row[HC_CONTACT_PHONE], str):
-            for x in ('ext', 'x', 'poste', ',', 'p'):
-                f_index = row[HC_CONTACT_PHONE].lower().find(x)
-                if f_index >= 0:
-                    extension = row[HC_CONTACT_PHONE][f_index + len(x):]
-                    row[HC_CONTACT_PHONE] = row[HC_CONTACT_PHONE][0:f_index]
-                    break
-            row[HC_CONTACT_PHONE] = re.sub("[^0-9]", "", row[HC_CONTACT_PHONE])
-        elif isinstance(row[HC_CONTACT_PHONE], int):
-            row[HC_CONTACT_PHONE] = str(row[HC_CONTACT_PHONE])
-        if row[HC_CONTACT_PHONE] and not row[HC_PHONE]:
-            row[HC_PHONE] = row[HC_CONTACT_PHONE]
-            row[HC_EXTENSION] = extension
-        if isinstance(row[HC_EXTENSION], str):
-            row[HC_EXTENSION] = re.sub("[^0-9]", "", row[HC_EXTENSION])
-        # make language lower case; currency, state ISO2 and country ISO2 upper case
-        row[HC_LANGUAGE] = row[HC_LANGUAGE].lower()
-        row[HC_CONTACT_LANGUAGE] = row[HC_CONTACT_LANGUAGE].lower()
-        row[HC_COUNTRY] = row[HC_COUNTRY].upper()
-        row[HC_STATE] = row[HC_STATE].upper()
-        row[HC_CONTACT_CURRENCY] = row[HC_CONTACT_CURRENCY].upper()
-        # convert date-time to windows format
-        row[HC_CONTACT_TIMEZONE] = convertFromIANATimezone(row[HC_CONTACT_TIMEZONE])
-    print(f'Completed reading {len(hc_data)} contractors.')
+        metrics.actions[row[action_column]] = metrics.actions.get(row[action_column], 0) + 1
+    metrics.search_stats = {tier: matcher.search_stats[tier]
+                            for tier in ('relationship', 'global', 'exact_name', 'exact_address')}
+    metrics.write(os.path.splitext(metrics_file)[0])
+
+
+def run(args, shared_matcher=None):
+    """Run the analysis (or the threshold sweep) described by the parsed command line
+
+    With a shared_matcher (--batch), its business units are used instead of reading the cbx list again.
+    """
+    metrics = RunMetrics()
+    config = MatchConfig.from_args(args)
+    profile = config.profile
+    # analysis columns of the rule profile
+    analysis_headers = profile.analysis_headers
+    rd_pricing_group_id_col = rd_pricing_group_code_col = -1
+    data_path = './data/'
+    cbx_file = data_path + args.cbx_list
+    hc_file = data_path + args.hc_list
+    output_file = data_path + args.output
+    metrics.set('rule_profile', profile.name)
+    metrics.set('output_format', args.output_format)
+
+    # output parameters used
+    print(f'Starting at {datetime.now()}')
+    print(f'Reading CBX list: {args.cbx_list} [{args.cbx_encoding}]')
+    print(f'Reading HC list: {args.hc_list}')
+    print(f'Outputting results in: {args.output}')
+    print(f'contractor match ratio: {args.ratio_company}')
+    print(f'address match ratio: {args.ratio_address}')
+    print(f'rule profile: {profile.name}')
+    print(f'list of generic domains:\n{BASE_GENERIC_DOMAIN}')
+    print(f'additional generic domain: {args.additional_generic_domain}')
+    xlsx_output = args.output_format == 'xlsx'
+    budget = MemoryBudget(args.max_memory * 1024 * 1024) if args.max_memory else None
+    # the in-memory workbook is saved while the rows are analysed, a memory budgeted one is written at the end
+    in_memory_xlsx = xlsx_output and not budget
+    if args.output_format == 'parquet' and not parquet_available():
+        print('WARNING: pyarrow is required for the parquet output format, install it with pip install pyarrow')
+        exit(-1)
+    sweep = args.sweep_company_ratios or args.sweep_address_ratios
+    if sweep and args.sample:
+        print('WARNING: --sample can not be used with a threshold sweep')
+        exit(-1)
+    # the threshold sweep and the sample estimate need all the rows at once, they always run in sequence
+    pipeline = Pipeline() if args.pipeline and not sweep and not args.sample else None
+    matcher = None
+    # read data
+    def load_cbx():
+        with metrics.timer('cbx_load'):
+            result_cache = open_result_cache(args, config, cbx_file, data_path)
+            if shared_matcher:
+                cbx_matcher = shared_matcher.with_config(config, result_cache)
+            else:
+                cbx_matcher = load_matcher(args, config, cbx_file, result_cache)
+        if cbx_matcher.detected_generic_domains:
+            print('generic domains detected in the cbx list: ' + ', '.join(
+                f'{domain} ({count})' for domain, count in cbx_matcher.detected_generic_domains.items()))
+        return cbx_matcher
+
+    if pipeline:
+        matcher_queue = pipeline.queue('business units', 1)
+        pipeline.stage('cbx reader', lambda: matcher_queue.put(load_cbx()))
+    else:
+        matcher = load_cbx()
+
+    with metrics.timer('hc_read'):
+        max_row, hc_rows = open_hc_list(args, hc_file)
+        if pipeline:
+            first_row = next(hc_rows, [])
+            total = max_row - 1
+        else:
+            hc_data = list(hc_rows)
+            first_row = hc_data[0] if hc_data else []
+            total = len(hc_data) - 1
+    metadata_indexes = []
+    rd_headers_mapping = []
+    hs_headers_mapping = []
+    existing_contractors_headers_mapping = []
+    headers = check_hc_headers(args, first_row)
+    if pipeline:
+        if args.no_headers and first_row:
+            hc_rows = itertools.chain([first_row], hc_rows)
+    else:
+        if not args.no_headers:
+            hc_data.pop(0)
+        with metrics.timer('hc_read'):
+            for row in hc_data:
+                prepare_hc_row(row, profile, args.ignore_warnings)
+        print(f'Completed reading {len(hc_data)} contractors.')
+    if args.sample:
+        print(f'Starting estimate on a sample of {args.sample} rows...')
+        estimate_actions(matcher, hc_data, args.sample, metrics.stage_seconds.get('cbx_load', 0.0), output_file)
+        print(f'Completed estimate at {datetime.now()}')
+        return
+    if sweep:
+        print('Starting threshold sweep...')
+        sweep_company_ratios = args.sweep_company_ratios.split(args.list_separator) \
+            if args.sweep_company_ratios else [args.ratio_company]
+        sweep_address_ratios = args.sweep_address_ratios.split(args.list_separator) \
+            if args.sweep_address_ratios else [args.ratio_address]
+        sweep_summary, sweep_changes = matcher.sweep(hc_data, sweep_company_ratios, sweep_address_ratios)
+        for row in sweep_summary:
+            counts = ', '.join(f'{name}: {count}' for name, count in zip(ACTIONS, row[2:-1]) if count)
+            print(f'company {row[0]}, address {row[1]} -> {counts} [{row[-1]} changed]')
+        write_sweep_report(sweep_summary, sweep_changes, output_file)
+        print(f'Completed threshold sweep at {datetime.now()}')
+        return
     print(f'Starting data analysis...')
 
-    out_wb = openpyxl.Workbook()
+    if in_memory_xlsx:
+        out_wb = openpyxl.Workbook()
+    elif budget:
+        if not xlsx_output:
+            output_file = os.path.splitext(output_file)[0]
+        out_wb = SpilledOutput(args.output_format, budget)
+    else:
+        # sheets are written in a directory named after the output file
+        output_file = os.path.splitext(output_file)[0]
+        out_wb = TableOutput(args.output_format)
     out_ws = out_wb.active
     out_ws.title = 'all'
     out_ws_onboarding = out_wb.create_sheet(title="onboarding")
@@ -532,15 +643,17 @@ if __name__ == '__main__':
         for md_index in metadata_indexes:
             metadata_array.insert(0, headers.pop(md_index))
         headers.extend(metadata_array)
-        hubspot_headers.extend(metadata_array)  # hubspot headers must includes metadata if present
-        existing_contractors_headers.extend(metadata_array)  # existing contractors headers must includes metadata if present
-        rd_headers.extend(metadata_array)
+        # copies of the sheet headers, the module lists are shared by the lists of a batch
+        sheet_hubspot_headers = hubspot_headers + metadata_array  # hubspot headers must includes metadata if present
+        # existing contractors headers must includes metadata if present
+        sheet_existing_contractors_headers = existing_contractors_headers + metadata_array
+        sheet_rd_headers = rd_headers + metadata_array if profile.import_metadata else rd_headers
         column_rd = column_hs = column_existing_contractors = 0
         for index, value in enumerate(headers):
             # skip the last two sheets since they have special mapping handled below
             for sheet in sheets[:-3]:
                 sheet.cell(1, index+1, value)
-            rd_headers_for_value = [s for s in rd_headers if value in s]
+            rd_headers_for_value = [s for s in sheet_rd_headers if value in s]
             if rd_headers_for_value:
                 column_rd += 1
                 rd_headers_mapping.append(True)
@@ -554,192 +667,91 @@ if __name__ == '__main__':
                 else:
                     adjustement = 0
 
-                if value in rd_headers:
+                if value in sheet_rd_headers:
                     out_ws_onboarding_rd.cell(1, column_rd + adjustement, value)
                 else:
                     out_ws_onboarding_rd.cell(1, column_rd, rd_headers_for_value[0])
             else:
                 rd_headers_mapping.append(False)
 
-            if value in hubspot_headers:
+            if value in sheet_hubspot_headers:
                 column_hs += 1
                 hs_headers_mapping.append(True)
                 out_ws_onboarding_hs.cell(1, column_hs, value)
             else:
                 hs_headers_mapping.append(False)
 
-            existing_contractors_headers_for_value = [s for s in existing_contractors_headers if value in s]
+            existing_contractors_headers_for_value = [s for s in sheet_existing_contractors_headers if value in s]
             if existing_contractors_headers_for_value:
                 column_existing_contractors += 1
                 existing_contractors_headers_mapping.append(True)
-                if value in existing_contractors_headers:
+                if value in sheet_existing_contractors_headers:
                     out_ws_existing_contractors.cell(1, column_existing_contractors, value)
                 else:
                     out_ws_existing_contractors.cell(1, column_existing_contractors, existing_contractors_headers_for_value[0])
             else:
                 existing_contractors_headers_mapping.append(False)
-                
-        out_wb.save(filename=output_file)
-    # match
-    for index, hc_row in enumerate(hc_data):
-        matches = []
-        hc_company = hc_row[HC_COMPANY]
-
-        clean_hc_company = clean_company_name(hc_company)
-        hc_email = str(hc_row[HC_EMAIL]).lower()
-        # if multiple values use the first one...
-        hc_email = hc_email.split(';')[0]
-        hc_email = hc_email.split('\n')[0]
-        hc_email = hc_email.split(',')[0]
-        hc_email = hc_email.strip()
-        hc_domain = hc_email[hc_email.find('@') + 1:]
-        hc_zip = str(hc_row[HC_ZIP]).replace(' ', '').upper()
-        hc_address = str(hc_row[HC_STREET]).lower().replace('.', '').strip()
-        hc_force_cbx = str(hc_row[HC_FORCE_CBX_ID])
-        if not smart_boolean(hc_row[HC_DO_NOT_MATCH]):
-            if hc_force_cbx:
-                cbx_row = next(filter(lambda x: x[CBX_ID].strip() == hc_force_cbx, cbx_data), None)
-                if cbx_row:
-                    matches.append(add_analysis_data(hc_row, cbx_row))
-            else:
-                for cbx_row in cbx_data:
-                    cbx_email = cbx_row[CBX_EMAIL].lower()
-                    cbx_domain = cbx_email[cbx_email.find('@') + 1:]
-                    contact_match = False
-                    if hc_email:
-                        if hc_domain in GENERIC_DOMAIN:
-                            contact_match = True if cbx_email == hc_email else False
-                        else:
-                            contact_match = True if cbx_domain == hc_domain else False
-                    else:
-                        contact_match = False
-                    cbx_zip = cbx_row[CBX_ZIP].replace(' ', '').upper()
-                    cbx_company_en = clean_company_name(cbx_row[CBX_COMPANY_EN])
-                    cbx_company_fr = clean_company_name(cbx_row[CBX_COMPANY_FR])
-                    cbx_parents = cbx_row[CBX_PARENTS]
-                    cbx_previous = cbx_row[CBX_COMPANY_OLD]
-                    cbx_address = cbx_row[CBX_ADDRESS].lower().replace('.', '').strip()
-                    ratio_company_fr = fuzz.token_sort_ratio(cbx_company_fr, clean_hc_company)
-                    ratio_company_en = fuzz.token_sort_ratio(cbx_company_en, clean_hc_company)
-                    if cbx_row[CBX_COUNTRY] != hc_row[HC_COUNTRY]:
-                        ratio_zip = ratio_address = 0.0
-                    else:
-                        ratio_zip = fuzz.ratio(cbx_zip, hc_zip)
-                        ratio_address = fuzz.token_sort_ratio(cbx_address, hc_address)
-                        ratio_address = ratio_address if ratio_zip == 0 else ratio_zip if ratio_address == 0 \
-                            else ratio_address * ratio_zip / 100
-                    ratio_company = ratio_company_fr if ratio_company_fr > ratio_company_en else ratio_company_en
-                    ratio_previous = 0
-                    for item in cbx_previous.split(args.list_separator):
-                        if item in (cbx_row[CBX_COMPANY_EN], cbx_row[CBX_COMPANY_FR]):
-                            continue
-                        item = clean_company_name(item)
-                        ratio = fuzz.token_sort_ratio(item, clean_hc_company)
-                        ratio_previous = ratio if ratio > ratio_previous else ratio_previous
-                    ratio_company = ratio_previous if ratio_previous > ratio_company else ratio_company
-                    if (contact_match or (ratio_company >= float(args.ratio_company)
-                                          and ratio_address >= float(args.ratio_address))):
-                        matches.append(
-                            add_analysis_data(hc_row, cbx_row, ratio_company, ratio_address, contact_match))
-                    elif ratio_company >= 95.0 or (ratio_company >= float(args.ratio_company)
-                                                   and ratio_address >= float(args.ratio_address)):
-                        matches.append(
-                            add_analysis_data(hc_row, cbx_row, ratio_company, ratio_address, contact_match))
-        ids = []
-        best_match = 0
-        # Exclude 'DO NOT USE' entries
-        matches = [m for m in matches if 'DO NOT USE' not in m['company'].upper()]
-
-        # Prioritize matches where the hiring client NAME is present in Cognibox hiring_client_names
-        hc_name = str(hc_row[HC_HIRING_CLIENT_NAME]).strip().lower()
-        def has_hc_name(m):
-            names = str(m.get('hiring_client_names', '')).lower().split(';')
-            return any(hc_name == n.strip() for n in names)
-        hc_matches = [m for m in matches if has_hc_name(m)]
-        if hc_matches:
-            matches = hc_matches
-
-        # Prefer 'Active' registration_status
-        active_matches = [m for m in matches if m.get('registration_status', '').strip() == 'Active']
-        if active_matches:
-            matches = active_matches
-
-        # Sort by modules and hiring_client_count, then address/company ratios
-        matches = sorted(matches, key=lambda x: (x.get('modules', 0), x.get('hiring_client_count', 0), x["ratio_address"], x["ratio_company"]), reverse=True)
-        for item in matches[0:10]:
-            ids.append(f'{item["cbx_id"]}, {item["company"]}, {item["address"]}, {item["city"]}, {item["state"]} '
-                       f'{item["country"]} {item["zip"]}, {item["email"]}, {item["first_name"]} {item["last_name"]}'
-                       f' --> CR{item["ratio_company"]}, AR{item["ratio_address"]},'
-                       f' CM{item["contact_match"]}, HCC{item["hiring_client_count"]}, M[{item["modules"]}]')
-        # append matching results to the hc_list
-        match_data = []
-        uniques_cbx_id = set(item['cbx_id'] for item in matches)
-        subscription_upgrade = False
-        upgrade_price = 0.00
-        prorated_upgrade_price = 0.00
-        if uniques_cbx_id:
-            for key, value in matches[0].items():
-                # Skip matched_qstatus - it's only used for internal logic, not output
-                if key != 'matched_qstatus':
-                    match_data.append(value)
-            hc_row.extend(match_data)
-            hc_row.append(True if hc_domain in GENERIC_DOMAIN else False)
-            hc_row.append(len(uniques_cbx_id) if len(uniques_cbx_id) else '')
-            hc_row.append(len([i for i in matches if i['hiring_client_count'] > 0]))
-            hc_row[HC_HEADER_LENGTH + analysis_headers.index("analysis")] = ('\n'.join(ids))
-            # Calculate subscription upgrade and prorating
-            if hc_row[HC_BASE_SUBSCRIPTION_FEE] == '':
-                base_subscription_fee = CBX_DEFAULT_STANDARD_SUBSCRIPTION
-                print(f'WARNING: no subscription fee defined for {hc_row[HC_COMPANY]}, using default {base_subscription_fee}')
-            else:
-                base_subscription_fee = hc_row[HC_BASE_SUBSCRIPTION_FEE]
-            current_sub_total = matches[0]['subscription_price'] + matches[0]['employee_price']
-            price_diff = float(base_subscription_fee) - current_sub_total
-            if price_diff > 0 and matches[0]['registration_status'] == 'Active' and matches[0]['expiration_date'] \
-                    and current_sub_total > 0.0:
-                subscription_upgrade = True
-                upgrade_price = price_diff
-                expiration_date = matches[0]['expiration_date']
-                now = datetime.now()
-                if expiration_date > now:
-                    delta = expiration_date - now
-                    days = delta.days if delta.days < 365 else 365
-                    prorated_upgrade_price = days / 365 * upgrade_price
-                else:
-                    prorated_upgrade_price = upgrade_price
-                if smart_boolean(hc_row[HC_IS_ASSOCIATION_FEE]):
-                    upgrade_price += 100.0
-                    prorated_upgrade_price += 100
-            if matches[0]['account_type'] in ('elearning', 'plan_nord', 'portail_pfr', 'special'):
-                subscription_upgrade = True
-                prorated_upgrade_price = upgrade_price = hc_row[HC_BASE_SUBSCRIPTION_FEE]
-            # print(f'CBX Assessment Level: {matches[0]["cbx_assessment_level"]}.  Requested Assesssment Level: {parse_assessment_level(hc_row[HC_ASSESSMENT_LEVEL])}')
-            if parse_assessment_level(matches[0]['cbx_assessment_level']) < parse_assessment_level(hc_row[HC_ASSESSMENT_LEVEL]):
-                # print("Assessment level upgrade")
-                subscription_upgrade = True
-                prorated_upgrade_price = upgrade_price
-        else:
-            hc_row.extend(['' for x in range(len(analysis_headers)-6)])
-        create_in_cognibox = False if len(uniques_cbx_id) and not hc_row[HC_AMBIGUOUS] else True
-        hc_row.append(subscription_upgrade)
-        hc_row.append(upgrade_price)
-        hc_row.append(prorated_upgrade_price)
-        hc_row.append(create_in_cognibox)
-        hc_row.append(action(hc_row, matches[0] if len(matches) else {}, create_in_cognibox,
-                             subscription_upgrade, matches[0]['expiration_date'] if len(matches) else None,
-                             matches[0]['is_qualified'] if len(matches) else False, args.ignore_warnings))
-        hc_row.append(index+1)
-        metadata_array = []
-        for md_index in metadata_indexes:
-            metadata_array.insert(0, hc_row.pop(md_index))
-        hc_row.extend(metadata_array)
-        for i, value in enumerate(hc_row):
-            out_ws.cell(index+2, i+1, value)
-        if index % 10:
+            
+        if in_memory_xlsx:
             out_wb.save(filename=output_file)
-        print(f'{index+1} of {total} [{len(uniques_cbx_id)} found]')
-
-    out_wb.save(filename=output_file)
+    # match
+    explain_rows = set(int(x) for x in args.explain_rows.split(args.list_separator) if x.strip())
+
+    def analyse(index, hc_row):
+        with metrics.timer('match'):
+            return index, hc_row, analyse_hc_row(matcher, hc_row, index, metadata_indexes, explain_rows)
+
+    if pipeline:
+        hc_queue = pipeline.queue('hc rows', PIPELINE_QUEUE_SIZE)
+        analysed_queue = pipeline.queue('analysed rows', PIPELINE_QUEUE_SIZE)
+
+        def read_stage():
+            count = 0
+            for hc_row in hc_rows:
+                with metrics.timer('hc_read'):
+                    prepare_hc_row(hc_row, profile, args.ignore_warnings)
+                hc_queue.put(hc_row)
+                count += 1
+            hc_queue.close()
+            print(f'Completed reading {count} contractors.')
+
+        def match_stage():
+            nonlocal matcher
+            matcher = matcher_queue.get()
+            for index, hc_row in enumerate(hc_queue):
+                analysed_queue.put(analyse(index, hc_row))
+            analysed_queue.close()
+
+        pipeline.stage('hc reader', read_stage)
+        pipeline.stage('matcher', match_stage)
+        analysed_rows = iter(analysed_queue)
+    else:
+        # with a memory budget the rows read are released as they are analysed
+        analysed_rows = (analyse(index, hc_row) for index, hc_row in enumerate(consume(hc_data) if budget else hc_data))
+    hc_data = SpillList(budget) if budget else []
+    for index, hc_row, analysis in analysed_rows:
+        hc_data.append(hc_row)
+        with metrics.timer('write'):
+            for i, value in enumerate(hc_row):
+                out_ws.cell(index+2, i+1, value)
+            if in_memory_xlsx and index % 10:
+                out_wb.save(filename=output_file)
+        print(f'{index+1} of {total} [{analysis[analysis_headers.index("match_count")] or 0} found]')
+    if pipeline:
+        pipeline.join()
+        print(pipeline.report())
+
+    write_start = time.perf_counter()
+    if in_memory_xlsx:
+        out_wb.save(filename=output_file)
+    print(f'{matcher.search_stats["relationship"]} rows resolved by hiring client relationships, '
+          f'{matcher.search_stats["global"]} rows scanned against all business units, '
+          f'{matcher.search_stats["exact_address"]} addresses matched exactly')
+    if config.exact_name_shortcut:
+        print(f'{matcher.search_stats["exact_name"]} rows resolved by an exact company name and postal code')
+    if matcher.result_cache:
+        matcher.result_cache.save()
+        print(matcher.result_cache.report())
 
     hc_onboarding = filter(lambda x: x[HC_HEADER_LENGTH+len(analysis_headers)-2] == 'onboarding', hc_data)
     for index, row in enumerate(hc_onboarding):
@@ -805,7 +817,8 @@ if __name__ == '__main__':
         for i, value in enumerate(row):
             out_ws_follow_up_qualification.cell(index + 2, i + 1, value)
 
-    existing_contractors_rd = filter(lambda x: x[HC_HEADER_LENGTH+len(analysis_headers)-2] != 'onboarding' and x[HC_HEADER_LENGTH+len(analysis_headers)-2] != 'missing_info' , hc_data)
+    existing_contractors_rd = filter(lambda x: x[HC_HEADER_LENGTH+len(analysis_headers)-2] != 'onboarding' and x[HC_HEADER_LENGTH+len(analysis_headers)-2] != 'missing_info'
+                                     and (x[HC_HEADER_LENGTH] != '' or not profile.existing_requires_match), hc_data)
 
     for index, row in enumerate(existing_contractors_rd):
         column = 0
@@ -814,7 +827,10 @@ if __name__ == '__main__':
                 column += 1
                 out_ws_existing_contractors.cell(index + 2, column, value)
 
-    hc_onboarding_rd = filter(lambda x: x[HC_HEADER_LENGTH+len(analysis_headers)-2] == 'onboarding',
+    hc_onboarding_rd = filter(lambda x: x[HC_HEADER_LENGTH+len(analysis_headers)-2] == 'onboarding' or
+                              (profile.import_unmatched_ambiguous and
+                               x[HC_HEADER_LENGTH+len(analysis_headers)-2] == 'ambiguous_onboarding' and
+                               x[HC_HEADER_LENGTH] == ''),
                               hc_data)
     for index, row in enumerate(hc_onboarding_rd):
         column = 0
@@ -835,6 +851,26 @@ if __name__ == '__main__':
                 column += 1
                 out_ws_onboarding_hs.cell(index + 2, column, value)
 
+    if not in_memory_xlsx:
+        if budget:
+            # rows added since the last check of the budget
+            budget.check()
+        if xlsx_output:
+            wrapped_columns = [HC_HEADER_LENGTH+analysis_headers.index(header)+1 for header in profile.wrapped_columns]
+            write_streamed_xlsx(sheets, output_file, wrapped_columns, len(hc_data), (out_ws_onboarding_rd,))
+        else:
+            out_wb.save(filename=output_file)
+        metrics.add_time('write', time.perf_counter() - write_start)
+        if args.metrics_file:
+            write_run_metrics(metrics, data_path + args.metrics_file, matcher, hc_data,
+                              HC_HEADER_LENGTH+len(analysis_headers)-2, output_file)
+        if budget:
+            print(f'{budget.spilled_rows} rows moved to disk to stay under {args.max_memory} MB')
+            hc_data.close()
+            out_wb.close()
+        print('Completed data analysis...')
+        print(f'Completed at {datetime.now()}')
+        return
     # formatting the excel...
     style = TableStyleInfo(name="TableStyleMedium2", showFirstColumn=False,
                            showLastColumn=False, showRowStripes=True, showColumnStripes=False)
@@ -850,17 +886,79 @@ if __name__ == '__main__':
         for col, value in dims.items():
             sheet.column_dimensions[col].width = value
         if sheet != out_ws_onboarding_rd:
-            sheet.column_dimensions[get_column_letter(HC_HEADER_LENGTH+analysis_headers.index("hc_contractor_summary")+1)].width = 150
-            sheet.column_dimensions[get_column_letter(HC_HEADER_LENGTH+analysis_headers.index("analysis")+1)].width = 150
-            sheet.column_dimensions[get_column_letter(HC_HEADER_LENGTH+len(analysis_headers)-17)].width = 150
-            sheet.column_dimensions[get_column_letter(HC_HEADER_LENGTH+len(analysis_headers)-18)].width = 150
-            for i in range(2, len(hc_data)+1):
-                sheet.cell(i, HC_HEADER_LENGTH+analysis_headers.index("analysis")+1).alignment = Alignment(wrapText=True)
-                sheet.cell(i, HC_HEADER_LENGTH+analysis_headers.index("hc_contractor_summary")+1).alignment = Alignment(wrapText=True)
-                sheet.cell(i, HC_HEADER_LENGTH+len(analysis_headers)-17).alignment = Alignment(wrapText=True)
-                sheet.cell(i, HC_HEADER_LENGTH+len(analysis_headers)-18).alignment = Alignment(wrapText=True)
-                
+            for header in profile.wrapped_columns:
+                column = HC_HEADER_LENGTH+analysis_headers.index(header)+1
+                sheet.column_dimensions[get_column_letter(column)].width = 150
+                for i in range(2, len(hc_data)+1):
+                    sheet.cell(i, column).alignment = Alignment(wrapText=True)
         sheet.add_table(tab)
     out_wb.save(filename=output_file)
+    metrics.add_time('write', time.perf_counter() - write_start)
+    if args.metrics_file:
+        write_run_metrics(metrics, data_path + args.metrics_file, matcher, hc_data,
+                          HC_HEADER_LENGTH+len(analysis_headers)-2, output_file)
     print(f'Completed data analysis...')
     print(f'Completed at {datetime.now()}')
+
+
+def read_batch(args, batch_file):
+    """Return the parsed command line of each list of the batch file, exit on unknown columns (unless ignored)"""
+    with open(batch_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    columns = reader.fieldnames or []
+    if 'hc_list' not in columns or 'output' not in columns:
+        print(f'WARNING: the batch file {args.batch} must have the hc_list and output columns')
+        exit(-1)
+    unknown_columns = [column for column in columns if column not in ('hc_list', 'output', *BATCH_OPTIONS)]
+    if unknown_columns:
+        print(f'WARNING: unknown batch columns {unknown_columns}, per list columns are {list(BATCH_OPTIONS)}')
+        if not args.ignore_warnings:
+            exit(-1)
+    batch = []
+    for row in rows:
+        list_args = argparse.Namespace(**vars(args))
+        list_args.hc_list = row['hc_list']
+        list_args.output = row['output']
+        for column, dest in BATCH_OPTIONS.items():
+            if row.get(column):
+                setattr(list_args, dest, row[column])
+        if list_args.output_format not in OUTPUT_FORMATS:
+            print(f'WARNING: unknown output format {list_args.output_format} for {list_args.hc_list}')
+            exit(-1)
+        batch.append(list_args)
+    return batch
+
+
+def run_batch(args):
+    """Analyse every hc list of the batch file against the cbx list read once"""
+    data_path = './data/'
+    batch = read_batch(args, data_path + args.batch)
+    print(f'Reading CBX list: {args.cbx_list} [{args.cbx_encoding}] for a batch of {len(batch)} hc lists')
+    matcher = load_matcher(args, MatchConfig.from_args(args), data_path + args.cbx_list)
+    for index, list_args in enumerate(batch):
+        print(f'Batch list {index+1} of {len(batch)}: {list_args.hc_list} -> {list_args.output}')
+        run(list_args, matcher)
+    print(f'Completed batch of {len(batch)} hc lists at {datetime.now()}')
+
+
+def main(argv=None):
+    """Parse the command line (sys.argv by default) and run the analysis or the batch it describes"""
+    args = parser.parse_args(argv)
+    if args.sample < 0:
+        parser.error(f'--sample must be a positive number of rows, got {args.sample}')
+    if args.max_memory < 0:
+        parser.error(f'--max_memory must be a positive number of MB, got {args.max_memory}')
+    if args.max_memory:
+        # the business units are memory-mapped to stay under the budget
+        args.mmap_cbx_list = True
+    if args.batch:
+        run_batch(args)
+    elif args.hc_list and args.output:
+        run(args)
+    else:
+        parser.error('hc_list and output are required (unless --batch is used)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import csv
+import mmap
+import os
+
+
+class MappedRow(list):
+    """csv row read from a MappedCsv, full_row() parses the row again from the mapped file
+
+    The row can be compacted (columns replaced by empty values) to keep only what is needed in memory.
+    """
+    __slots__ = ('source', 'offset')
+
+    def __init__(self, values, source, offset):
+        super().__init__(values)
+        self.source = source
+        self.offset = offset
+
+    def full_row(self):
+        return self.source.row(self.offset)
+
+
+class MappedCsv:
+    """csv file mapped in memory, rows are indexed by the byte offset where they start
+
+    Lines are split on b'\\n' before decoding, the encoding must be ascii compatible (utf-8, latin-1, cp1252...).
+    """
+
+    def __init__(self, path, encoding='utf-8-sig'):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, 'rb')
+        # mmap can not map an empty file
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b''
+        self.position = 0
+
+    def _lines(self, position):
+        size = len(self.buffer)
+        while position < size:
+            end = self.buffer.find(b'\n', position)
+            end = size if end < 0 else end + 1
+            line = self.buffer[position:end].decode(self.encoding)
+            # the csv reader only asks for the next line when it needs it, so after a row is read position is the
+            # offset of the next row
+            self.position = position = end
+            yield line
+
+    def rows(self):
+        """Yield every row of the file as a MappedRow"""
+        self.position = 0
+        reader = csv.reader(self._lines(0))
+        while True:
+            offset = self.position
+            row = next(reader, None)
+            if row is None:
+                return
+            yield MappedRow(row, self, offset)
+
+    def row(self, offset):
+        """Return the row starting at offset as a list"""
+        return next(csv.reader(self._lines(offset)))
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.file.close()
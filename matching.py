@@ -0,0 +1,1157 @@
+"""Matching engine of the onboarding analysis
+
+Matches hiring client contractor rows to CBX business units. The module has no side effects at import, main.py is
+the command line front end and other tools (workers, services, benchmarks) can use the engine directly:
+
+    config = MatchConfig(ratio_company=80, ratio_address=80)
+    matcher = Matcher(cbx_rows, config)
+    for row in hc_rows:
+        normalize_hc_row(row)
+    for analysis in matcher.match_rows(hc_rows):
+        ...
+"""
+import copy
+import heapq
+import re
+import string
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from fuzzywuzzy import fuzz, utils
+from convertTimeZone import convertFromIANATimezone
+from mapped_csv import MappedRow
+
+CBX_DEFAULT_STANDARD_SUBSCRIPTION = 803
+CBX_HEADER_LENGTH = 28
+# noinspection SpellCheckingInspection
+CBX_ID, CBX_COMPANY_FR, CBX_COMPANY_EN, CBX_COMPANY_OLD, CBX_ADDRESS, CBX_CITY, CBX_STATE, \
+    CBX_COUNTRY, CBX_ZIP, CBX_FISTNAME, CBX_LASTNAME, CBX_EMAIL, CBX_EXPIRATION_DATE, CBX_REGISTRATION_STATUS, \
+    CBX_SUSPENDED, CBX_MODULES, CBX_ACCESS_MODES, CBX_ACCOUNT_TYPE, CBX_SUB_PRICE_CAD, CBX_EMPL_PRICE_CAD,\
+    CBX_SUB_PRICE_USD, CBX_EMPL_PRICE_USD, CBX_HIRING_CLIENT_NAMES, \
+    CBX_HIRING_CLIENT_IDS, CBX_HIRING_CLIENT_QSTATUS, CBX_PARENTS, CBX_ASSESSMENT_LEVEL, CBX_IS_NEW_PRODUCT = range(CBX_HEADER_LENGTH)
+# values parsed at load time (see enrich_cbx_row) are appended after the csv columns
+CBX_ENRICHMENT = CBX_HEADER_LENGTH
+# columns read from the business unit rows while matching, the others are only read from the enrichment or when a
+# match is reported (rows of a MappedCsv only keep these columns in memory)
+CBX_MATCH_COLUMNS = (CBX_ID, CBX_COMPANY_FR, CBX_COMPANY_EN, CBX_COUNTRY, CBX_EMAIL, CBX_REGISTRATION_STATUS,
+                     CBX_MODULES)
+
+HC_HEADER_LENGTH = 41
+HC_COMPANY, HC_FIRSTNAME, HC_LASTNAME, HC_EMAIL, HC_CONTACT_PHONE, HC_CONTACT_LANGUAGE, HC_STREET, HC_CITY, \
+    HC_STATE, HC_COUNTRY, HC_ZIP, HC_CATEGORY, HC_DESCRIPTION, HC_PHONE, HC_EXTENSION, HC_FAX,  HC_WEBSITE,\
+    HC_LANGUAGE, HC_IS_TAKE_OVER, HC_TAKEOVER_QUALIFICATION_DATE, HC_TAKEOVER_QF_STATUS, \
+    HC_PROJECT_NAME, HC_QUESTIONNAIRE_NAME, HC_QUESTIONNAIRE_ID, HC_PRICING_GROUP_ID, HC_PRICING_GROUP_CODE, \
+    HC_HIRING_CLIENT_NAME, HC_HIRING_CLIENT_ID, HC_IS_ASSOCIATION_FEE, HC_BASE_SUBSCRIPTION_FEE, \
+    HC_CONTACT_CURRENCY, HC_AGENT_IN_CHARGE_ID, HC_TAKEOVER_FOLLOW_UP_DATE, HC_TAKEOVER_RENEWAL_DATE, \
+    HC_INFORMATION_SHARED, HC_CONTACT_TIMEZONE, HC_DO_NOT_MATCH, HC_FORCE_CBX_ID, HC_AMBIGUOUS, \
+    HC_CONTRACTORCHECK_ACCOUNT, HC_ASSESSMENT_LEVEL \
+    = range(HC_HEADER_LENGTH)
+
+SUPPORTED_CURRENCIES = ('CAD', 'USD')
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+MAX_REPORTED_MATCHES = 10
+
+# version of the scoring rules, part of the config identity so results scored by older rules are not reused
+SCORING_VERSION = 2
+
+# noinspection SpellCheckingInspection
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st', 'str': 'st', 'rue': 'st', 'saint': 'st', 'sainte': 'ste',
+    'avenue': 'ave', 'av': 'ave',
+    'boulevard': 'blvd', 'boul': 'blvd', 'bd': 'blvd', 'blv': 'blvd',
+    'road': 'rd', 'chemin': 'rd', 'ch': 'rd',
+    'drive': 'dr', 'lane': 'ln', 'place': 'pl', 'court': 'ct', 'circle': 'cir', 'square': 'sq',
+    'crescent': 'cres', 'croissant': 'cres', 'terrace': 'terr', 'parkway': 'pkwy',
+    'highway': 'hwy', 'autoroute': 'hwy', 'route': 'rte',
+    'unit': 'unit', 'suite': 'unit', 'apt': 'unit', 'apartment': 'unit', 'app': 'unit', 'appartement': 'unit',
+    'bureau': 'unit', 'local': 'unit', 'unite': 'unit', 'unité': 'unit',
+    'north': 'n', 'nord': 'n', 'south': 's', 'sud': 's', 'east': 'e', 'est': 'e', 'west': 'w', 'ouest': 'w',
+}
+
+assessment_levels = {
+    "gold": 2,
+    "silver": 2,
+    "bronze" : 1,
+    "level3": 2, 
+    "level2": 2,
+    "level1": 1,
+    "3":2,
+    "2":2,
+    "1":1
+}
+
+cc_migration_assessment_levels = {
+    "gold": 3,
+    "silver": 2,
+    "bronze": 1,
+    "level3": 3,
+    "level2": 2,
+    "level1": 1
+}
+
+TRUE_VALUES = ('true', '=true', 'yes', 'vraie', '=vraie', '1')
+
+# noinspection SpellCheckingInspection
+cbx_headers = ['id', 'name_fr', 'name_en', 'old_names', 'address', 'city', 'state', 'country', 'postal_code',
+               'first_name', 'last_name', 'email', 'cbx_expiration_date', 'registration_code', 'suspended',
+               'modules', 'access_modes', 'code', 'subscription_price_cad', 'employee_price_cad',
+               'subscription_price_usd', 'employee_price_usd', 'hiring_client_names',
+               'hiring_client_ids', 'hiring_client_qstatus', 'parents', 'assessment_level', 'new_product']
+
+# noinspection SpellCheckingInspection
+hiring_client_headers = ['contractor_name', 'contact_first_name', 'contact_last_name', 'contact_email', 'contact_phone',
+              'contact_language', 'address', 'city', 'province_state_iso2', 'country_iso2',
+              'postal_code', 'category', 'description', 'phone', 'extension', 'fax', 'website', 'language',
+              'is_take_over', 'qualification_expiration_date',
+              'qualification_status', 'batch', 'questionnaire_name', 'questionnaire_id',
+              'pricing_group_id', 'pricing_group_code', 'hiring_client_name', 'hiring_client_id', 'is_association_fee',
+              'base_subscription_fee', 'contact_currency', 'agent_in_charge_id', 'take_over_follow-up_date',
+              'renewal_date', 'information_shared', 'contact_timezone', 'do_not_match',
+              'force_cbx_id', 'ambiguous', 'contractorcheck_account', 'assessment_level']
+
+# noinspection SpellCheckingInspection
+analysis_headers = ['cbx_id', 'hc_contractor_summary', 'analysis','cbx_contractor', 'cbx_street', 'cbx_city', 'cbx_state', 'cbx_zip', 'cbx_country',
+                    'cbx_expiration_date', 'registration_status', 'suspended', 'cbx_email',
+                    'cbx_first_name', 'cbx_last_name', 'modules', 'cbx_account_type',
+                    'cbx_subscription_fee', 'cbx_employee_price', 'parents', 'previous',
+                    'hiring_client_names', 'hiring_client_count',
+                    'is_in_relationship', 'is_qualified', 'ratio_company', 'ratio_address',
+                    'contact_match', 'cbx_assessment_level', 'new_product', 'generic_domain', 'match_count', 'match_count_with_hc',
+                    'is_subscription_upgrade', 'upgrade_price', 'prorated_upgrade_price', 'create_in_cbx',
+                    'action', 'index']
+
+# noinspection SpellCheckingInspection
+cc_migration_analysis_headers = ['cbx_id', 'cbx_contractor', 'cbx_street', 'cbx_city', 'cbx_state', 'cbx_zip',
+                                 'cbx_country', 'cbx_expiration_date', 'registration_status', 'suspended', 'cbx_email',
+                                 'cbx_first_name', 'cbx_last_name', 'modules', 'cbx_account_type',
+                                 'cbx_subscription_fee', 'cbx_employee_price', 'parents', 'previous',
+                                 'hiring_client_names', 'hiring_client_count',
+                                 'is_in_relationship', 'is_qualified', 'ratio_company', 'ratio_address',
+                                 'contact_match', 'cbx_assessment_level', 'new_product', 'generic_domain',
+                                 'match_count', 'match_count_with_hc', 'analysis', 'is_subscription_upgrade',
+                                 'upgrade_price', 'prorated_upgrade_price', 'create_in_cbx', 'action', 'index']
+
+ACTIONS = ('onboarding', 'association_fee', 're_onboarding', 'subscription_upgrade', 'ambiguous_onboarding',
+           'restore_suspended', 'activation_link', 'already_qualified', 'add_questionnaire', 'missing_info',
+           'follow_up_qualification')
+
+# noinspection SpellCheckingInspection
+BASE_GENERIC_DOMAIN = ['yahoo.ca', 'yahoo.com', 'hotmail.com', 'gmail.com', 'outlook.com',
+                       'bell.com', 'bell.ca', 'videotron.ca', 'eastlink.ca', 'kos.net', 'bellnet.ca', 'sasktel.net',
+                       'aol.com', 'tlb.sympatico.ca', 'sogetel.net', 'cgocable.ca',
+                       'hotmail.ca', 'live.ca', 'icloud.com', 'hotmail.fr', 'yahoo.com', 'outlook.fr', 'msn.com',
+                       'globetrotter.net', 'live.com', 'sympatico.ca', 'live.fr', 'yahoo.fr', 'telus.net',
+                       'shaw.ca', 'me.com', 'bell.net', 'cablevision.qc.ca', 'live.ca', 'tlb.sympatico.ca',
+                       '', 'videotron.qc.ca', 'ivic.qc.ca', 'qc.aira.com', 'canada.ca', 'axion.ca', 'bellsouth.net', 
+                       'telusplanet.net','rogers.com', 'mymts.net', 'nb.aibn.com', 'on.aibn.com', 'live.be', 'nbnet.nb.ca',
+                       'execulink.com', 'bellaliant.com', 'nf.aibn.com', 'clintar.com', 'pathcom.com', 'oricom.ca', 'mts.net',
+                       'xplornet.com', 'mcsnet.ca', 'att.net', 'ymail.com', 'mail.com', 'bellaliant.net', 'ns.sympatico.ca', 
+                       'ns.aliantzinc.ca', 'mnsi.net']
+# noinspection SpellCheckingInspection
+BASE_GENERIC_COMPANY_NAME_WORDS = ['construction', 'contracting', 'industriel', 'industriels', 'service',
+                                   'services', 'inc', 'limited', 'ltd', 'ltee', 'ltée', 'co', 'industrial',
+                                   'solutions', 'llc', 'enterprises', 'systems', 'industries',
+                                   'technologies', 'company', 'corporation', 'installations', 'enr']
+
+
+if len(hiring_client_headers) != HC_HEADER_LENGTH:
+    raise AssertionError('hc header inconsistencies')
+
+if len(cbx_headers) != CBX_HEADER_LENGTH:
+    raise AssertionError('cbx header inconsistencies')
+
+
+class RuleProfile:
+    """Business rules of one edition of the analysis, selected on the command line with --rule_profile
+
+    The standard profile is the analysis of main.py. The cc_migration profile keeps the rules of the cc migration
+    runs: hiring client names compared as is, qualification from the validated status only, matches ranked by
+    (hiring_client_count, ratio_address, ratio_company), a six weeks renewal window, only 'Contractor' business
+    units, phone extensions split from the phone column and its own analysis columns and output sheets.
+    """
+
+    def __init__(self, name, analysis_headers, assessment_levels, true_values, renewal_window, match_summary,
+                 wrapped_columns, relationship_ranking=True, normalized_hiring_clients=True, contractors_only=False,
+                 split_phone_extension=False, import_metadata=True, import_unmatched_ambiguous=False,
+                 existing_requires_match=False):
+        self.name = name
+        self.analysis_headers = analysis_headers
+        self.assessment_levels = assessment_levels
+        self.true_values = true_values
+        self.renewal_window = renewal_window
+        # format of each match listed in the analysis column, fields are the keys of add_analysis_data
+        self.match_summary = match_summary
+        # analysis columns written 150 wide and wrapped in the output sheets
+        self.wrapped_columns = wrapped_columns
+        # exclude 'DO NOT USE' business units, prefer the ones in relationship with the hiring client then the
+        # active ones and rank by modules first
+        self.relationship_ranking = relationship_ranking
+        # compare hiring client names without punctuation or case and use the qualification status of the match
+        self.normalized_hiring_clients = normalized_hiring_clients
+        self.contractors_only = contractors_only
+        self.split_phone_extension = split_phone_extension
+        # sheets: metadata columns in 'Data to import', ambiguous rows without match imported as new contractors
+        # and only matched rows in 'Existing Contractors'
+        self.import_metadata = import_metadata
+        self.import_unmatched_ambiguous = import_unmatched_ambiguous
+        self.existing_requires_match = existing_requires_match
+
+
+STANDARD_PROFILE = RuleProfile(
+    'standard', analysis_headers, assessment_levels, TRUE_VALUES, timedelta(days=60),
+    '{cbx_id}, {company}, {address}, {city}, {state} {country} {zip}, {email}, {first_name} {last_name}'
+    ' --> CR{ratio_company}, AR{ratio_address}, CM{contact_match}, HCC{hiring_client_count}, M[{modules}]',
+    ('hc_contractor_summary', 'analysis', 'hiring_client_names', 'previous'))
+
+CC_MIGRATION_PROFILE = RuleProfile(
+    'cc_migration', cc_migration_analysis_headers, cc_migration_assessment_levels,
+    tuple(x for x in TRUE_VALUES if x != 'yes'), timedelta(weeks=6),
+    '{cbx_id}, {company}, {address}, {city}, {state} {country} {zip}, {email}'
+    ' --> CR{ratio_company}, AR{ratio_address}, CM{contact_match}, HCC{hiring_client_count}',
+    ('analysis', 'is_in_relationship', 'hiring_client_count', 'hiring_client_names'),
+    relationship_ranking=False, normalized_hiring_clients=False, contractors_only=True, split_phone_extension=True,
+    import_metadata=False, import_unmatched_ambiguous=True, existing_requires_match=True)
+
+RULE_PROFILES = {profile.name: profile for profile in (STANDARD_PROFILE, CC_MIGRATION_PROFILE)}
+
+
+class MatchConfig:
+    """Matching parameters, main.py builds it from the command line (see MatchConfig.from_args)"""
+
+    def __init__(self, ratio_company=80, ratio_address=80, additional_generic_domain='',
+                 additional_generic_name_word='', list_separator=';', ignore_warnings=False, rule_profile='standard',
+                 exact_name_shortcut=False, generic_domain_min_count=0, generic_domain_min_share=0.0):
+        self.ratio_company = float(ratio_company)
+        self.ratio_address = float(ratio_address)
+        self.list_separator = list_separator
+        self.generic_domains = set(BASE_GENERIC_DOMAIN + additional_generic_domain.split(list_separator))
+        self.generic_company_name_words = BASE_GENERIC_COMPANY_NAME_WORDS + \
+            additional_generic_name_word.split(list_separator)
+        self.ignore_warnings = ignore_warnings
+        self.profile = RULE_PROFILES[rule_profile]
+        # skip the scan of all business units when one has the same company name and zip (see find_candidates)
+        self.exact_name_shortcut = exact_name_shortcut
+        # email domains shared by at least this number or share of the business units are generic (0: disabled),
+        # see Matcher
+        self.generic_domain_min_count = int(generic_domain_min_count)
+        self.generic_domain_min_share = float(generic_domain_min_share)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(ratio_company=args.ratio_company, ratio_address=args.ratio_address,
+                   additional_generic_domain=args.additional_generic_domain,
+                   additional_generic_name_word=args.additional_generic_name_word,
+                   list_separator=args.list_separator, ignore_warnings=args.ignore_warnings,
+                   rule_profile=args.rule_profile, exact_name_shortcut=args.exact_name_shortcut,
+                   generic_domain_min_count=args.generic_domain_min_count,
+                   generic_domain_min_share=args.generic_domain_min_share)
+
+    def with_generic_domains(self, domains):
+        """Return a copy of the config with domains added to its generic domains"""
+        config = copy.copy(self)
+        config.generic_domains = self.generic_domains | set(domains)
+        return config
+
+    def identity(self):
+        """Return the parameters that change match results, used to invalidate cached results"""
+        return [self.ratio_company, self.ratio_address, sorted(self.generic_domains),
+                self.generic_company_name_words, self.list_separator, self.profile.name, SCORING_VERSION,
+                self.exact_name_shortcut, self.generic_domain_min_count, self.generic_domain_min_share]
+
+    def cbx_identity(self):
+        """Return the parameters that change how business units are loaded, used to check prepared cbx lists"""
+        return [self.generic_company_name_words, self.list_separator, self.profile.contractors_only, SCORING_VERSION]
+
+
+def smart_boolean(bool_data, true_values=TRUE_VALUES):
+    if isinstance(bool_data, str):
+        bool_data = bool_data.lower().strip()
+        return True if bool_data in true_values else False
+    else:
+        return bool(bool_data)
+
+
+def normalize_hiring_client_name(name):
+    if not name:
+        return ''
+    # Remove punctuation, lowercase, and strip whitespace
+    return str(name).translate(PUNCTUATION_TABLE).strip().lower()
+
+
+def canonical_address(address):
+    """Return the address lower cased, without punctuation and with english/french street types, unit and
+    direction words abbreviated the same way (Ex: '123 Main Street, Suite 4' and '123 main st #4' are both
+    '123 main st unit 4')"""
+    address = str(address).lower().replace('.', '').replace('#', ' unit ')
+    tokens = []
+    for token in re.split(r'[\W_]+', address):
+        if not token:
+            continue
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token == 'unit' and tokens and tokens[-1] == 'unit':
+            continue
+        tokens.append(token)
+    return ' '.join(tokens)
+
+
+def parse_cbx_date(value):
+    try:
+        return datetime.strptime(value, "%d/%m/%y") if value else None
+    except ValueError:
+        return datetime.strptime(value, "%d/%m/%Y") if value else None
+
+
+def enrich_cbx_row(cbx_row, list_separator=';', generic_words=BASE_GENERIC_COMPANY_NAME_WORDS):
+    """Parse once the business unit values needed to build match records
+
+    The enrichment is stored in the row at CBX_ENRICHMENT, invalid values are returned as error messages and
+    replaced by empty values.
+    """
+    errors = []
+    try:
+        expiration_date = parse_cbx_date(cbx_row[CBX_EXPIRATION_DATE])
+    except ValueError:
+        errors.append(f'invalid expiration date "{cbx_row[CBX_EXPIRATION_DATE]}"')
+        expiration_date = None
+    prices = {}
+    for column in (CBX_SUB_PRICE_CAD, CBX_EMPL_PRICE_CAD, CBX_SUB_PRICE_USD, CBX_EMPL_PRICE_USD):
+        try:
+            prices[column] = float(cbx_row[column]) if cbx_row[column] else 0.0
+        except ValueError:
+            errors.append(f'invalid {cbx_headers[column]} "{cbx_row[column]}"')
+            prices[column] = 0.0
+    hiring_clients_list = [normalize_hiring_client_name(x)
+                           for x in cbx_row[CBX_HIRING_CLIENT_NAMES].split(list_separator)]
+    hiring_clients_qstatus = cbx_row[CBX_HIRING_CLIENT_QSTATUS].split(list_separator)
+    # status of the first occurrence of each hiring client, None when the status list is too short
+    hiring_clients = {}
+    for idx, val in enumerate(hiring_clients_list):
+        hiring_clients.setdefault(val, hiring_clients_qstatus[idx].strip().lower()
+                                  if idx < len(hiring_clients_qstatus) else None)
+    raw_hiring_clients = cbx_row[CBX_HIRING_CLIENT_NAMES].split(list_separator)
+    company_en = clean_company_name(cbx_row[CBX_COMPANY_EN], generic_words)
+    company_fr = clean_company_name(cbx_row[CBX_COMPANY_FR], generic_words)
+    previous = [clean_company_name(item, generic_words) for item in cbx_row[CBX_COMPANY_OLD].split(list_separator)
+                if item not in (cbx_row[CBX_COMPANY_EN], cbx_row[CBX_COMPANY_FR])]
+    del cbx_row[CBX_ENRICHMENT:]
+    cbx_row.append({
+        'expiration_date': expiration_date,
+        'prices': {'CAD': (prices[CBX_SUB_PRICE_CAD], prices[CBX_EMPL_PRICE_CAD]),
+                   'USD': (prices[CBX_SUB_PRICE_USD], prices[CBX_EMPL_PRICE_USD])},
+        'hiring_clients': hiring_clients,
+        'relationship_names': set(x.strip() for x in cbx_row[CBX_HIRING_CLIENT_NAMES].lower().split(';')),
+        'hiring_client_count': len(hiring_clients_list) if cbx_row[CBX_HIRING_CLIENT_NAMES] else 0,
+        # cleaned company names (see clean_company_name) and their exact match keys (see company_name_key)
+        'company_en': company_en,
+        'company_fr': company_fr,
+        'previous': previous,
+        'name_keys': set(key for key in map(company_name_key, [company_en, company_fr] + previous) if key),
+        'address': canonical_address(cbx_row[CBX_ADDRESS]),
+        'zip': cbx_row[CBX_ZIP].replace(' ', '').upper(),
+        # names as written in the export, used by profiles without normalized hiring clients
+        'raw_hiring_clients': set(raw_hiring_clients),
+        'raw_validated_hiring_clients': set(name for name, qstatus in zip(raw_hiring_clients, hiring_clients_qstatus)
+                                            if qstatus == 'validated'),
+    })
+    return errors
+
+
+# noinspection PyShadowingNames
+def add_analysis_data(hc_row, cbx_row, ratio_company=None, ratio_address=None, contact_match=None,
+                      profile=STANDARD_PROFILE):
+    enrichment = cbx_row[CBX_ENRICHMENT]
+    if isinstance(cbx_row, MappedRow):
+        cbx_row = cbx_row.full_row()
+    cbx_company = cbx_row[CBX_COMPANY_FR] if cbx_row[CBX_COMPANY_FR] else cbx_row[CBX_COMPANY_EN]
+    print('   --> ', cbx_company, parse_hc_email(hc_row[HC_EMAIL])[0], cbx_row[CBX_ID], ratio_company, ratio_address,
+          contact_match)
+    if profile.normalized_hiring_clients:
+        hc_name_norm = normalize_hiring_client_name(hc_row[HC_HIRING_CLIENT_NAME])
+        is_in_relationship = hc_name_norm in enrichment['hiring_clients'] and hc_name_norm != ''
+        matched_qstatus = enrichment['hiring_clients'].get(hc_name_norm)
+        is_qualified = matched_qstatus == 'validated'
+    else:
+        hc_name = hc_row[HC_HIRING_CLIENT_NAME]
+        is_in_relationship = True if hc_name and hc_name in enrichment['raw_hiring_clients'] else False
+        matched_qstatus = None
+        is_qualified = hc_name in enrichment['raw_validated_hiring_clients']
+    subscription_price, employee_price = enrichment['prices']['CAD' if hc_row[HC_CONTACT_CURRENCY] == 'CAD' else 'USD']
+    hiring_client_contractor_summary = f'{hc_row[HC_COMPANY]}, {hc_row[HC_STREET]}, {hc_row[HC_CITY]}, {hc_row[HC_STATE]}, {hc_row[HC_COUNTRY]}, {hc_row[HC_ZIP]}, {hc_row[HC_EMAIL]}, {hc_row[HC_FIRSTNAME]} {hc_row[HC_LASTNAME]}'
+
+    if hc_row[HC_CONTACT_CURRENCY] != '' and hc_row[HC_CONTACT_CURRENCY] not in SUPPORTED_CURRENCIES:
+        raise AssertionError(f'Invalid currency: {hc_row[HC_CONTACT_CURRENCY]}, must be in {SUPPORTED_CURRENCIES}')
+
+    return {'cbx_id': int(cbx_row[CBX_ID]), 'hc_contractor_summary': hiring_client_contractor_summary, 'analysis':'', 'company': cbx_company, 'address': cbx_row[CBX_ADDRESS],
+        'city': cbx_row[CBX_CITY], 'state': cbx_row[CBX_STATE], 'zip': cbx_row[CBX_ZIP],
+        'country': cbx_row[CBX_COUNTRY], 'expiration_date': enrichment['expiration_date'],
+        'registration_status': cbx_row[CBX_REGISTRATION_STATUS],
+        'suspended': cbx_row[CBX_SUSPENDED], 'email': cbx_row[CBX_EMAIL], 'first_name': cbx_row[CBX_FISTNAME],
+        'last_name': cbx_row[CBX_LASTNAME], 'modules': cbx_row[CBX_MODULES],
+        'account_type': cbx_row[CBX_ACCOUNT_TYPE],
+        'subscription_price': subscription_price, 'employee_price': employee_price,
+        'parents': cbx_row[CBX_PARENTS], 'previous': cbx_row[CBX_COMPANY_OLD],
+        'hiring_client_names': cbx_row[CBX_HIRING_CLIENT_NAMES], 'hiring_client_count': enrichment['hiring_client_count'],
+        'is_in_relationship': is_in_relationship, 'is_qualified': is_qualified,
+        'matched_qstatus': matched_qstatus,
+        'ratio_company': ratio_company, 'ratio_address': ratio_address, 'contact_match': contact_match, 
+        'cbx_assessment_level': cbx_row[CBX_ASSESSMENT_LEVEL],
+        'new_product': cbx_row[CBX_IS_NEW_PRODUCT]
+        }
+
+
+class TopMatches:
+    """Best matches of a hc row, kept in bounded heaps instead of a full list of match records
+
+    Matches are ranked as the analysis always did: 'DO NOT USE' business units are excluded, business units in
+    relationship with the hiring client are preferred, then 'Active' ones, then the highest
+    (modules, hiring_client_count, ratio_address, ratio_company). One heap is kept per preference tier and the
+    match counts of every tier are tracked exactly, match records are only built for the retained candidates.
+    Profiles without relationship_ranking keep a single tier ranked by
+    (hiring_client_count, ratio_address, ratio_company).
+    """
+
+    def __init__(self, hc_row, size=MAX_REPORTED_MATCHES, profile=STANDARD_PROFILE):
+        self.hc_row = hc_row
+        self.profile = profile
+        self.hc_name = str(hc_row[HC_HIRING_CLIENT_NAME]).strip().lower()
+        self.size = size
+        self.heaps = {}
+        self.cbx_ids = {}
+        self.with_hc_counts = {}
+        self.sequence = 0
+        # match records built by add_analysis_data, retained or replaced later
+        self.records = 0
+
+    def add(self, cbx_row, ratio_company=None, ratio_address=None, contact_match=None):
+        hc_count = cbx_row[CBX_ENRICHMENT]['hiring_client_count']
+        if self.profile.relationship_ranking:
+            if is_excluded(cbx_row):
+                return
+            tier = (self.hc_name in cbx_row[CBX_ENRICHMENT]['relationship_names'],
+                    cbx_row[CBX_REGISTRATION_STATUS].strip() == 'Active')
+            key = (cbx_row[CBX_MODULES], hc_count, ratio_address, ratio_company)
+        else:
+            tier = ()
+            key = (hc_count, ratio_address, ratio_company)
+        self.cbx_ids.setdefault(tier, set()).add(int(cbx_row[CBX_ID]))
+        self.with_hc_counts[tier] = self.with_hc_counts.get(tier, 0) + (1 if hc_count > 0 else 0)
+        # ties keep the scan order, the earliest candidate ranks first
+        self.sequence += 1
+        rank = (key, -self.sequence)
+        heap = self.heaps.setdefault(tier, [])
+        if len(heap) < self.size:
+            self.records += 1
+            heapq.heappush(heap, (rank, add_analysis_data(self.hc_row, cbx_row, ratio_company, ratio_address,
+                                                          contact_match, self.profile)))
+        elif rank > heap[0][0]:
+            self.records += 1
+            heapq.heapreplace(heap, (rank, add_analysis_data(self.hc_row, cbx_row, ratio_company, ratio_address,
+                                                             contact_match, self.profile)))
+
+    def best_tier(self):
+        return max(self.heaps) if self.heaps else None
+
+    def best(self):
+        """Return the retained matches of the preferred tier, best first"""
+        tier = self.best_tier()
+        return [match for rank, match in sorted(self.heaps[tier], reverse=True)] if tier is not None else []
+
+    @property
+    def match_count(self):
+        tier = self.best_tier()
+        return len(self.cbx_ids[tier]) if tier is not None else 0
+
+    @property
+    def match_count_with_hc(self):
+        tier = self.best_tier()
+        return self.with_hc_counts[tier] if tier is not None else 0
+
+
+def core_mandatory_provided(hcd):
+    mandatory_fields = (HC_COMPANY, HC_FIRSTNAME, HC_LASTNAME, HC_EMAIL, HC_CONTACT_PHONE,
+                        HC_STREET, HC_CITY, HC_STATE, HC_COUNTRY, HC_ZIP)
+    country = hcd[HC_COUNTRY].strip().lower() if isinstance(hcd[HC_COUNTRY], str) else hcd[HC_COUNTRY]
+    for field in mandatory_fields:
+        f_value = hcd[field].strip() if isinstance(hcd[field], str) else hcd[field]
+        if f_value == "":
+            if field == HC_STATE and country not in ('ca', 'us'):
+                pass
+            else:
+                return False
+    return True
+
+
+# noinspection PyShadowingNames
+def action(hc_data, cbx_data, create, subscription_update, expiration_date, is_qualified, ignore,
+           profile=STANDARD_PROFILE):
+    if create:
+        if smart_boolean(hc_data[HC_IS_TAKE_OVER], profile.true_values):
+            return 'activation_link'
+        else:
+            if smart_boolean(hc_data[HC_AMBIGUOUS], profile.true_values):
+                return 'ambiguous_onboarding'
+            elif core_mandatory_provided(hc_data):
+                return 'onboarding'
+            else:
+                return 'missing_info'
+    else:
+        reg_status = cbx_data['registration_status']
+        if smart_boolean(hc_data[HC_IS_TAKE_OVER], profile.true_values):
+            if reg_status == 'Suspended':
+                return 'restore_suspended'
+            elif reg_status == 'Active':
+                return 'add_questionnaire'
+            elif reg_status == 'Non Member':
+                return 'activation_link'
+            else:
+                print(f'WARNING: invalid registration status {hc_data[CBX_REGISTRATION_STATUS]}')
+                if not ignore:
+                    exit(-1)
+        else:
+            if reg_status == 'Active':
+                if cbx_data['is_in_relationship']:
+                    qstatus = cbx_data.get('matched_qstatus', None)
+                    if qstatus == 'validated':
+                        return 'already_qualified'
+                    elif qstatus in ('pending', 'expired', 'conditional', 'refused'):
+                        return 'follow_up_qualification'
+                    else:
+                        # If qstatus is missing or unknown, fallback to previous logic
+                        if is_qualified:
+                            return 'already_qualified'
+                        else:
+                            return 'follow_up_qualification'
+                else:
+                    if subscription_update:
+                        return 'subscription_upgrade'
+                    elif smart_boolean(hc_data[HC_IS_ASSOCIATION_FEE], profile.true_values) \
+                            and not cbx_data['is_in_relationship']:
+                        # Association fee only if renewal is after the renewal window, else add questionnaire
+                        if expiration_date:
+                            renewal_window_end = datetime.now() + profile.renewal_window
+                            if expiration_date > renewal_window_end:
+                                return 'association_fee'
+                            else:
+                                return 'add_questionnaire'
+                        else:
+                            return 'association_fee'
+                    else:
+                        return 'add_questionnaire'
+            elif reg_status == 'Suspended':
+                return 'restore_suspended'
+            elif reg_status in ('Non Member', '', None):
+                return 're_onboarding'
+            else:
+                raise AssertionError(f'invalid registration status: {reg_status}')
+
+
+def remove_generics(company_name, generic_words):
+    for word in generic_words:
+        company_name = re.sub(r'\b' + word + r'\b', '', company_name)
+    return company_name
+
+
+def clean_company_name(name, generic_words=BASE_GENERIC_COMPANY_NAME_WORDS):
+    name = name.lower().replace('.', '').replace(',', '').strip()
+    name = re.sub(r"\([^()]*\)", "", name)
+    name = remove_generics(name, generic_words)
+    return name
+
+
+def company_name_key(clean_name):
+    """Return the form of a cleaned company name compared by token_sort_ratio, names with the same non empty key
+    have a ratio of 100"""
+    return ' '.join(sorted(utils.full_process(clean_name, force_ascii=True).split()))
+
+
+def parse_assessment_level(level, levels=assessment_levels):
+    if(level is None or (isinstance(level, int) and level > 0 and level < 4)):
+        return level
+    
+    if(level.lower() in levels):
+        return levels[level.lower()]
+    
+    return 0
+
+
+def parse_hc_email(email):
+    email = str(email).lower()
+    # if multiple values use the first one...
+    email = email.split(';')[0]
+    email = email.split('\n')[0]
+    email = email.split(',')[0]
+    email = email.strip()
+    return email, email[email.find('@') + 1:]
+
+
+# noinspection PyShadowingNames
+class ExplainStage:
+    """Business units considered, scored and accepted (candidates) by one step of the matching of a hc row"""
+
+    def __init__(self, name):
+        self.name = name
+        self.considered = 0
+        self.scored = 0
+        self.accepted = 0
+        self.seconds = 0.0
+        self.start = time.perf_counter()
+
+    @property
+    def pruned(self):
+        return self.considered - self.accepted
+
+
+class MatchExplanation:
+    """Where the matching time of one hc row goes, see Matcher.match_row
+
+    Each step (search tier, ranking) is an ExplainStage, score_seconds is the time spent in each part of the pair
+    scoring and top the retained matches as (cbx_id, company, ratio_company, ratio_address, contact_match).
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.current = None
+        self.score_seconds = {}
+        self.seconds = 0.0
+        self.top = []
+
+    def stage(self, name):
+        self.current = ExplainStage(name)
+        self.stages.append(self.current)
+        return self.current
+
+    def end_stage(self, stage):
+        stage.seconds = time.perf_counter() - stage.start
+
+    def timed(self, name, function):
+        self.score_seconds.setdefault(name, 0.0)
+
+        def timed_function(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.score_seconds[name] += time.perf_counter() - start
+        return timed_function
+
+    def report(self):
+        lines = [f'  {"step":<16}{"considered":>12}{"scored":>10}{"pruned":>10}{"accepted":>10}{"seconds":>10}']
+        for stage in self.stages:
+            lines.append(f'  {stage.name:<16}{stage.considered:>12}{stage.scored:>10}{stage.pruned:>10}'
+                         f'{stage.accepted:>10}{stage.seconds:>10.3f}')
+        if self.score_seconds:
+            lines.append('  scoring: ' + ', '.join(f'{name} {seconds:.3f}s'
+                                                   for name, seconds in self.score_seconds.items()))
+        lines.append(f'  total: {self.seconds:.3f}s')
+        for cbx_id, company, ratio_company, ratio_address, contact_match in self.top:
+            lines.append(f'  {cbx_id}, {company} --> CR{ratio_company}, AR{ratio_address}, CM{contact_match}')
+        return '\n'.join(lines)
+
+
+def find_candidates(hc_row, cbx_data, config, min_ratio_company=None, min_ratio_address=None,
+                    relationship_index=None, search_stats=None, name_index=None, explain=None):
+    """Yield (cbx_row, ratio_company, ratio_address, contact_match) for every business unit matching hc_row
+
+    With a relationship_index (see build_relationship_index), the business units already in relationship with the
+    hiring client are scored first. If one of them is a candidate, the other business units can not change the
+    analysis of the row (TopMatches only keeps the relationship tier) and they are not scored at all. The tier used
+    is counted in search_stats when given.
+
+    Addresses are compared in their canonical form (see canonical_address). When the canonical address and the
+    zip of both rows are identical the address ratio is 100 without fuzzy scoring, these pairs are counted as
+    search_stats['exact_address']. Company names with the same key (see company_name_key) score 100 the same way.
+
+    With a name_index (see build_name_index, used by config.exact_name_shortcut), when a business unit has the same
+    company name key and zip as hc_row only the business units with the same company name key are scored, the
+    other business units are not scanned. These rows are counted as search_stats['exact_name'].
+
+    Every pair scored is counted as search_stats['scored_pairs'].
+
+    With a MatchExplanation, the business units considered, scored and accepted by each search tier and the time
+    spent in each part of the scoring are recorded in it (the candidates must be consumed without delay for the
+    tier durations to be meaningful).
+    """
+    min_ratio_company = float(config.ratio_company if min_ratio_company is None else min_ratio_company)
+    min_ratio_address = float(config.ratio_address if min_ratio_address is None else min_ratio_address)
+    generic_words = config.generic_company_name_words
+    clean_hc_company = clean_company_name(hc_row[HC_COMPANY], generic_words)
+    hc_name_key = company_name_key(clean_hc_company)
+    hc_email, hc_domain = parse_hc_email(hc_row[HC_EMAIL])
+    hc_zip = str(hc_row[HC_ZIP]).replace(' ', '').upper()
+    hc_address = canonical_address(hc_row[HC_STREET])
+    hc_force_cbx = str(hc_row[HC_FORCE_CBX_ID])
+    if smart_boolean(hc_row[HC_DO_NOT_MATCH], config.profile.true_values):
+        return
+    if hc_force_cbx:
+        stage = explain.stage('forced_cbx_id') if explain else None
+        cbx_row = next(filter(lambda x: x[CBX_ID].strip() == hc_force_cbx, cbx_data), None)
+        if stage:
+            stage.considered = len(cbx_data)
+            stage.accepted = 1 if cbx_row else 0
+            explain.end_stage(stage)
+        if cbx_row:
+            yield cbx_row, None, None, None
+        return
+
+    # identical non empty canonical address and zip score 100, as token_sort_ratio and ratio would
+    exact_address = bool(hc_address and hc_zip)
+
+    def contact(cbx_row):
+        cbx_email = cbx_row[CBX_EMAIL].lower()
+        cbx_domain = cbx_email[cbx_email.find('@') + 1:]
+        if hc_email:
+            if hc_domain in config.generic_domains:
+                return True if cbx_email == hc_email else False
+            else:
+                return True if cbx_domain == hc_domain else False
+        return False
+
+    def address(cbx_row, enrichment):
+        if cbx_row[CBX_COUNTRY] != hc_row[HC_COUNTRY]:
+            return 0.0
+        elif exact_address and enrichment['address'] == hc_address and enrichment['zip'] == hc_zip:
+            if search_stats is not None:
+                search_stats['exact_address'] += 1
+            return 100.0
+        ratio_zip = fuzz.ratio(enrichment['zip'], hc_zip)
+        ratio_address = fuzz.token_sort_ratio(enrichment['address'], hc_address)
+        return ratio_address if ratio_zip == 0 else ratio_zip if ratio_address == 0 \
+            else ratio_address * ratio_zip / 100
+
+    def company(enrichment):
+        ratio_company_fr = fuzz.token_sort_ratio(enrichment['company_fr'], clean_hc_company)
+        ratio_company_en = fuzz.token_sort_ratio(enrichment['company_en'], clean_hc_company)
+        return ratio_company_fr if ratio_company_fr > ratio_company_en else ratio_company_en
+
+    def previous_names(enrichment):
+        ratio_previous = 0
+        for item in enrichment['previous']:
+            ratio = fuzz.token_sort_ratio(item, clean_hc_company)
+            ratio_previous = ratio if ratio > ratio_previous else ratio_previous
+        return ratio_previous
+
+    # token_sort_ratio(name, hc company) is the ratio of their company name keys, the ratio of each distinct key of
+    # the current and previous names is computed once for the hc row however many business units share it
+    name_ratios = {}
+
+    def names(enrichment):
+        ratio_company = 0
+        for key in enrichment['name_keys']:
+            ratio = name_ratios.get(key)
+            if ratio is None:
+                ratio = name_ratios[key] = fuzz.ratio(key, hc_name_key)
+            ratio_company = ratio if ratio > ratio_company else ratio_company
+        return ratio_company
+
+    if explain:
+        contact, address, company, previous_names, names = (explain.timed(name, function) for name, function in (
+            ('contact', contact), ('address', address), ('company', company), ('previous_names', previous_names),
+            ('names', names)))
+
+    def score(cbx_row):
+        if search_stats is not None:
+            search_stats['scored_pairs'] += 1
+        if explain:
+            explain.current.scored += 1
+        enrichment = cbx_row[CBX_ENRICHMENT]
+        contact_match = contact(cbx_row)
+        ratio_address = address(cbx_row, enrichment)
+        if hc_name_key:
+            if hc_name_key in enrichment['name_keys']:
+                return 100, ratio_address, contact_match
+            return names(enrichment), ratio_address, contact_match
+        # empty names (without a key) have a ratio of 100 to an hc company without a key
+        ratio_company = company(enrichment)
+        ratio_previous = previous_names(enrichment)
+        ratio_company = ratio_previous if ratio_previous > ratio_company else ratio_company
+        return ratio_company, ratio_address, contact_match
+
+    scored_rows = set()
+    hc_name = str(hc_row[HC_HIRING_CLIENT_NAME]).strip().lower()
+    if relationship_index is not None and hc_name:
+        in_relationship = False
+        stage = explain.stage('relationship') if explain else None
+        for position in relationship_index.get(hc_name, ()):
+            scored_rows.add(position)
+            cbx_row = cbx_data[position]
+            ratio_company, ratio_address, contact_match = score(cbx_row)
+            if is_candidate(ratio_company, ratio_address, contact_match, min_ratio_company, min_ratio_address):
+                in_relationship = in_relationship or not is_excluded(cbx_row)
+                if stage:
+                    stage.accepted += 1
+                yield cbx_row, ratio_company, ratio_address, contact_match
+        if stage:
+            stage.considered = stage.scored
+            explain.end_stage(stage)
+        if in_relationship:
+            if search_stats is not None:
+                search_stats['relationship'] += 1
+            return
+    if name_index is not None and hc_name_key and hc_zip:
+        exact_rows = [position for position in name_index.get(hc_name_key, ()) if position not in scored_rows]
+        if any(cbx_data[position][CBX_ENRICHMENT]['zip'] == hc_zip and not is_excluded(cbx_data[position])
+               for position in exact_rows):
+            if search_stats is not None:
+                search_stats['exact_name'] += 1
+            stage = explain.stage('exact_name') if explain else None
+            for position in exact_rows:
+                cbx_row = cbx_data[position]
+                ratio_company, ratio_address, contact_match = score(cbx_row)
+                if stage:
+                    stage.accepted += 1
+                yield cbx_row, ratio_company, ratio_address, contact_match
+            if stage:
+                stage.considered = stage.scored
+                explain.end_stage(stage)
+            return
+    if search_stats is not None:
+        search_stats['global'] += 1
+    stage = explain.stage('global') if explain else None
+    for position, cbx_row in enumerate(cbx_data):
+        if position in scored_rows:
+            continue
+        ratio_company, ratio_address, contact_match = score(cbx_row)
+        if is_candidate(ratio_company, ratio_address, contact_match, min_ratio_company, min_ratio_address):
+            if stage:
+                stage.accepted += 1
+            yield cbx_row, ratio_company, ratio_address, contact_match
+    if stage:
+        stage.considered = len(cbx_data)
+        explain.end_stage(stage)
+
+
+def build_relationship_index(cbx_data):
+    """Map each hiring client name (as compared by TopMatches) to the positions of its business units in cbx_data"""
+    relationship_index = {}
+    for position, cbx_row in enumerate(cbx_data):
+        for name in cbx_row[CBX_ENRICHMENT]['relationship_names']:
+            if name:
+                relationship_index.setdefault(name, []).append(position)
+    return relationship_index
+
+
+def build_name_index(cbx_data):
+    """Map each company name key (see company_name_key) to the positions of its business units in cbx_data"""
+    name_index = {}
+    for position, cbx_row in enumerate(cbx_data):
+        for key in cbx_row[CBX_ENRICHMENT]['name_keys']:
+            name_index.setdefault(key, []).append(position)
+    return name_index
+
+
+def is_excluded(cbx_row):
+    cbx_company = cbx_row[CBX_COMPANY_FR] if cbx_row[CBX_COMPANY_FR] else cbx_row[CBX_COMPANY_EN]
+    return 'DO NOT USE' in cbx_company.upper()
+
+
+def is_candidate(ratio_company, ratio_address, contact_match, min_ratio_company, min_ratio_address):
+    return contact_match or ratio_company >= 95.0 or (ratio_company >= min_ratio_company
+                                                      and ratio_address >= min_ratio_address)
+
+
+# noinspection PyShadowingNames
+def analyse_matches(hc_row, top_matches, hc_domain, config):
+    """Return the analysis columns (the analysis_headers of the profile but the index) of hc_row for its matches"""
+    profile = config.profile
+    analysis = []
+    ids = []
+    matches = top_matches.best()
+    for item in matches:
+        ids.append(profile.match_summary.format(**item))
+    # append matching results to the hc_list
+    subscription_upgrade = False
+    upgrade_price = 0.00
+    prorated_upgrade_price = 0.00
+    if matches:
+        for key, value in matches[0].items():
+            # Skip matched_qstatus - it's only used for internal logic, not output
+            if key != 'matched_qstatus':
+                analysis.append(value)
+        analysis.append(True if hc_domain in config.generic_domains else False)
+        analysis.append(top_matches.match_count)
+        analysis.append(top_matches.match_count_with_hc)
+        analysis[analysis_headers.index("analysis")] = ('\n'.join(ids))
+        # Calculate subscription upgrade and prorating
+        if hc_row[HC_BASE_SUBSCRIPTION_FEE] == '':
+            base_subscription_fee = CBX_DEFAULT_STANDARD_SUBSCRIPTION
+            print(f'WARNING: no subscription fee defined for {hc_row[HC_COMPANY]}, using default {base_subscription_fee}')
+        else:
+            base_subscription_fee = hc_row[HC_BASE_SUBSCRIPTION_FEE]
+        current_sub_total = matches[0]['subscription_price'] + matches[0]['employee_price']
+        price_diff = float(base_subscription_fee) - current_sub_total
+        if price_diff > 0 and matches[0]['registration_status'] == 'Active' and matches[0]['expiration_date'] \
+                and current_sub_total > 0.0:
+            subscription_upgrade = True
+            upgrade_price = price_diff
+            expiration_date = matches[0]['expiration_date']
+            now = datetime.now()
+            if expiration_date > now:
+                delta = expiration_date - now
+                days = delta.days if delta.days < 365 else 365
+                prorated_upgrade_price = days / 365 * upgrade_price
+            else:
+                prorated_upgrade_price = upgrade_price
+            if smart_boolean(hc_row[HC_IS_ASSOCIATION_FEE], profile.true_values):
+                upgrade_price += 100.0
+                prorated_upgrade_price += 100
+        if matches[0]['account_type'] in ('elearning', 'plan_nord', 'portail_pfr', 'special'):
+            subscription_upgrade = True
+            prorated_upgrade_price = upgrade_price = hc_row[HC_BASE_SUBSCRIPTION_FEE]
+        if parse_assessment_level(matches[0]['cbx_assessment_level'], profile.assessment_levels) < \
+                parse_assessment_level(hc_row[HC_ASSESSMENT_LEVEL], profile.assessment_levels):
+            subscription_upgrade = True
+            prorated_upgrade_price = upgrade_price
+    else:
+        analysis.extend(['' for x in range(len(analysis_headers)-6)])
+    create_in_cognibox = False if matches and not smart_boolean(hc_row[HC_AMBIGUOUS], profile.true_values) else True
+    analysis.append(subscription_upgrade)
+    analysis.append(upgrade_price)
+    analysis.append(prorated_upgrade_price)
+    analysis.append(create_in_cognibox)
+    analysis.append(action(hc_row, matches[0] if len(matches) else {}, create_in_cognibox,
+                           subscription_upgrade, matches[0]['expiration_date'] if len(matches) else None,
+                           matches[0]['is_qualified'] if len(matches) else False, config.ignore_warnings, profile))
+    # columns in the order of the profile
+    columns = dict(zip(analysis_headers, analysis))
+    return [columns[header] for header in profile.analysis_headers[:-1]]
+
+
+def extract_extension(phone_number, existing_extension):
+    phone_number = phone_number.replace(" ", "")
+    phone_number = phone_number.lower().replace("#", "x")
+    phone_number = phone_number.lower().replace("ext", "x")
+    phone_number = phone_number.lower().replace("p", "x")
+    phone_number = phone_number.lower().replace("poste", "x")
+    phone_number = phone_number.lower().replace(",", "x")
+    split_number = phone_number.split("x", 1)
+
+    if existing_extension:
+        if len(split_number) < 2:
+            split_number.append(existing_extension)
+        else:
+            split_number[1] = existing_extension
+
+    return split_number
+
+
+def normalize_hc_row(row, profile=STANDARD_PROFILE):
+    """Normalize a hc row in place (phones, case of codes, timezone), return the consistency warnings of the row"""
+    warnings = []
+    if row[HC_COUNTRY].lower().strip() == 'ca':
+        if row[HC_CONTACT_CURRENCY].lower().strip() not in ('cad', ''):
+            warnings.append(f'currency and country mismatch: {row[HC_CONTACT_CURRENCY]} and'
+                            f' "{row[HC_COUNTRY]}". Expected CAD in row {row}')
+    elif row[HC_COUNTRY].lower().strip() != '':
+        if row[HC_CONTACT_CURRENCY].lower().strip() not in ('usd', ''):
+            warnings.append(f'currency and country mismatch: {row[HC_CONTACT_CURRENCY]} and'
+                            f' "{row[HC_COUNTRY]}". Expected USD in row {row}')
+    row[HC_EMAIL] = str(row[HC_EMAIL]).strip()
+    # numeric assessment levels of csv lists are text
+    if isinstance(row[HC_ASSESSMENT_LEVEL], str) and row[HC_ASSESSMENT_LEVEL].strip().isdigit():
+        row[HC_ASSESSMENT_LEVEL] = int(row[HC_ASSESSMENT_LEVEL])
+    # correct and normalize phone number
+    extension = ''
+    if isinstance(row[HC_CONTACT_PHONE], str):
+        for x in ('ext', 'x', 'poste', ',', 'p'):
+            f_index = row[HC_CONTACT_PHONE].lower().find(x)
+            if f_index >= 0:
+                extension = row[HC_CONTACT_PHONE][f_index + len(x):]
+                row[HC_CONTACT_PHONE] = row[HC_CONTACT_PHONE][0:f_index]
+                break
+        row[HC_CONTACT_PHONE] = re.sub("[^0-9]", "", row[HC_CONTACT_PHONE])
+    elif isinstance(row[HC_CONTACT_PHONE], int):
+        row[HC_CONTACT_PHONE] = str(row[HC_CONTACT_PHONE])
+    if row[HC_CONTACT_PHONE] and not row[HC_PHONE]:
+        row[HC_PHONE] = row[HC_CONTACT_PHONE]
+        row[HC_EXTENSION] = extension
+    if isinstance(row[HC_EXTENSION], str):
+        row[HC_EXTENSION] = re.sub("[^0-9]", "", row[HC_EXTENSION])
+    if profile.split_phone_extension and isinstance(row[HC_PHONE], str):
+        phone_extension_pair = extract_extension(row[HC_PHONE], row[HC_EXTENSION])
+        row[HC_PHONE] = phone_extension_pair[0]
+        if len(phone_extension_pair) > 1 and extension == '':
+            row[HC_EXTENSION] = phone_extension_pair[1]
+    # make language lower case; currency, state ISO2 and country ISO2 upper case
+    row[HC_LANGUAGE] = row[HC_LANGUAGE].lower()
+    row[HC_CONTACT_LANGUAGE] = row[HC_CONTACT_LANGUAGE].lower()
+    row[HC_COUNTRY] = row[HC_COUNTRY].upper()
+    row[HC_STATE] = row[HC_STATE].upper()
+    row[HC_CONTACT_CURRENCY] = row[HC_CONTACT_CURRENCY].upper()
+    # convert date-time to windows format
+    row[HC_CONTACT_TIMEZONE] = convertFromIANATimezone(row[HC_CONTACT_TIMEZONE])
+    return warnings
+
+
+class Matcher:
+    """Business units loaded and indexed once, against which hc rows are matched
+
+    cbx_data is an iterable of business unit rows (cbx_headers columns, without the header row), profiles with
+    contractors_only keep the 'Contractor' business units only. Values that can not be parsed are listed in
+    load_errors as (cbx_id, message) and ignored. Rows of a MappedCsv are compacted to CBX_MATCH_COLUMNS once
+    enriched, so a large list is never held in memory with all its columns. With a ResultCache, rows already
+    matched against the same business units and config reuse their cached candidates. With load_errors, cbx_data
+    are the rows of a prepared cbx list (see prepared_cbx.py), already filtered, enriched and compacted, and
+    load_errors the errors found when it was prepared. Email domains shared by more business units than the
+    generic_domain_min_count or generic_domain_min_share of the config are listed with their count in
+    detected_generic_domains and added to the generic_domains of the matcher config, a copy of the config given.
+    """
+
+    def __init__(self, cbx_data, config, result_cache=None, load_errors=None):
+        self.cbx_data = []
+        self.config = config
+        self.result_cache = result_cache
+        self.load_errors = []
+        if load_errors is not None:
+            self.cbx_data = list(cbx_data)
+            self.load_errors = list(load_errors)
+            cbx_data = ()
+        for row in cbx_data:
+            # ignore training and hiring client accounts
+            if config.profile.contractors_only and 'Contractor' not in row[CBX_ACCESS_MODES].split(';'):
+                continue
+            for error in enrich_cbx_row(row, config.list_separator, config.generic_company_name_words):
+                self.load_errors.append((row[CBX_ID], error))
+            if isinstance(row, MappedRow):
+                for column in range(CBX_HEADER_LENGTH):
+                    if column not in CBX_MATCH_COLUMNS:
+                        row[column] = ''
+            self.cbx_data.append(row)
+        cbx_data = self.cbx_data
+        self.relationship_index = build_relationship_index(cbx_data)
+        self.name_index = build_name_index(cbx_data) if config.exact_name_shortcut else None
+        self.cbx_by_id = {}
+        if result_cache:
+            for row in cbx_data:
+                self.cbx_by_id.setdefault(row[CBX_ID].strip(), row)
+        # hc rows resolved by the relationship search tier, by an exact name and zip (exact_name_shortcut) or by a
+        # scan of all business units, address pairs resolved without fuzzy scoring, pairs scored and pairs above the
+        # match ratios
+        self.search_stats = {'relationship': 0, 'global': 0, 'exact_name': 0, 'exact_address': 0,
+                             'scored_pairs': 0, 'candidate_pairs': 0}
+        self.domain_counts = Counter(email[email.find('@') + 1:]
+                                     for email in (row[CBX_EMAIL].strip().lower() for row in cbx_data) if '@' in email)
+        self.detected_generic_domains = self.detect_generic_domains(config)
+        self.config = config.with_generic_domains(self.detected_generic_domains)
+
+    def detect_generic_domains(self, config):
+        """Return the email domains shared by too many business units for config (not already generic) with their
+        number of business units (most frequent first)"""
+        detected = {}
+        for domain, count in self.domain_counts.most_common():
+            if domain in config.generic_domains:
+                continue
+            if (config.generic_domain_min_count and count >= config.generic_domain_min_count) or \
+                    (config.generic_domain_min_share and count >= config.generic_domain_min_share * len(self.cbx_data)):
+                detected[domain] = count
+        return detected
+
+    def with_config(self, config, result_cache=None):
+        """Return a Matcher sharing the business units and indexes of this one with other match parameters
+
+        config must load business units the same way (same cbx_identity and exact_name_shortcut).
+        """
+        matcher = copy.copy(self)
+        matcher.result_cache = result_cache
+        if result_cache and not self.cbx_by_id:
+            matcher.cbx_by_id = {}
+            for row in self.cbx_data:
+                matcher.cbx_by_id.setdefault(row[CBX_ID].strip(), row)
+        matcher.search_stats = dict.fromkeys(self.search_stats, 0)
+        matcher.detected_generic_domains = matcher.detect_generic_domains(config)
+        matcher.config = config.with_generic_domains(matcher.detected_generic_domains)
+        return matcher
+
+    def match_row(self, hc_row, explain=None):
+        """Return the analysis columns (analysis_headers without the index) of a normalized hc row
+
+        With a MatchExplanation the row is always scored (the result cache is not read) and the steps of the
+        matching are recorded in it.
+        """
+        start = time.perf_counter()
+        hc_email, hc_domain = parse_hc_email(hc_row[HC_EMAIL])
+        top_matches = TopMatches(hc_row, profile=self.config.profile)
+        cached = None
+        if self.result_cache:
+            cache_key = self.result_cache.key(hc_row)
+            cached = None if explain else self.result_cache.get(cache_key)
+        if cached is not None:
+            for cbx_id, ratio_company, ratio_address, contact_match in cached:
+                top_matches.add(self.cbx_by_id[cbx_id], ratio_company, ratio_address, contact_match)
+        else:
+            cache_entry = []
+            # the relationship search tier only applies when TopMatches prefers relationships
+            relationship_index = self.relationship_index if self.config.profile.relationship_ranking else None
+            candidates = find_candidates(hc_row, self.cbx_data, self.config, relationship_index=relationship_index,
+                                         search_stats=self.search_stats, name_index=self.name_index,
+                                         explain=explain)
+            if explain:
+                # score everything first so the ranking time is not counted in the search tiers
+                candidates = list(candidates)
+                stage = explain.stage('ranking')
+                stage.considered = stage.scored = len(candidates)
+            for cbx_row, ratio_company, ratio_address, contact_match in candidates:
+                if ratio_company is None or is_candidate(ratio_company, ratio_address, contact_match,
+                                                         float(self.config.ratio_company),
+                                                         float(self.config.ratio_address)):
+                    self.search_stats['candidate_pairs'] += 1
+                top_matches.add(cbx_row, ratio_company, ratio_address, contact_match)
+                if self.result_cache:
+                    cache_entry.append((cbx_row[CBX_ID].strip(), ratio_company, ratio_address, contact_match))
+            if self.result_cache:
+                self.result_cache.put(cache_key, cache_entry)
+        analysis = analyse_matches(hc_row, top_matches, hc_domain, self.config)
+        if explain:
+            # analysis records built for the candidates entering the top matches
+            stage.accepted = top_matches.records
+            explain.end_stage(stage)
+            explain.top = [(item['cbx_id'], item['company'], item['ratio_company'], item['ratio_address'],
+                            item['contact_match']) for item in top_matches.best()]
+            explain.seconds = time.perf_counter() - start
+        return analysis
+
+    def match_rows(self, hc_rows):
+        """Yield the analysis columns of each normalized hc row"""
+        for hc_row in hc_rows:
+            yield self.match_row(hc_row)
+
+    def sweep(self, hc_rows, company_ratios, address_ratios):
+        """Score the hc rows once and evaluate their action for each combination of company and address ratios
+
+        The first setting is the one of the config, it is the reference used to report action changes.
+        Return the action counts of each setting and the rows whose action differs from the reference.
+        """
+        settings = [(self.config.ratio_company, self.config.ratio_address)]
+        for ratio_company in company_ratios:
+            for ratio_address in address_ratios:
+                if (float(ratio_company), float(ratio_address)) not in settings:
+                    settings.append((float(ratio_company), float(ratio_address)))
+        floor_company = min(setting[0] for setting in settings)
+        floor_address = min(setting[1] for setting in settings)
+        actions = {setting: [] for setting in settings}
+        for index, hc_row in enumerate(hc_rows):
+            hc_email, hc_domain = parse_hc_email(hc_row[HC_EMAIL])
+            scored = list(find_candidates(hc_row, self.cbx_data, self.config, floor_company, floor_address,
+                                          name_index=self.name_index))
+            for setting in settings:
+                top_matches = TopMatches(hc_row, profile=self.config.profile)
+                for cbx_row, ratio_company, ratio_address, contact_match in scored:
+                    if ratio_company is None or is_candidate(ratio_company, ratio_address, contact_match, *setting):
+                        top_matches.add(cbx_row, ratio_company, ratio_address, contact_match)
+                actions[setting].append(analyse_matches(hc_row, top_matches, hc_domain, self.config)[-1])
+            print(f'{index+1} of {len(hc_rows)} [{len(scored)} candidates above {floor_company}/{floor_address}]')
+        summary = []
+        changes = []
+        reference = actions[settings[0]]
+        for setting in settings:
+            counts = dict.fromkeys(ACTIONS, 0)
+            changed = 0
+            for index, row_action in enumerate(actions[setting]):
+                counts[row_action] = counts.get(row_action, 0) + 1
+                if row_action != reference[index]:
+                    changed += 1
+                    changes.append([setting[0], setting[1], index + 1, hc_rows[index][HC_COMPANY],
+                                    reference[index], row_action])
+            summary.append([setting[0], setting[1]] + [counts[x] for x in ACTIONS] + [changed])
+        return summary, changes
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class PipelineAborted(Exception):
+    pass
+
+
+class StageQueue:
+    """Bounded queue between two stages, keeps the highest depth reached and the time the stages waited on it
+
+    A long put wait means the consumer is the bottleneck, a long get wait means the producer is.
+    """
+
+    def __init__(self, name, maxsize, aborted):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize)
+        self.aborted = aborted
+        self.items = 0
+        self.max_depth = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def put(self, item):
+        start = time.perf_counter()
+        while True:
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self.aborted.is_set():
+                    raise PipelineAborted()
+        self.put_wait += time.perf_counter() - start
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        if item is not _END:
+            self.items += 1
+
+    def get(self):
+        start = time.perf_counter()
+        while True:
+            try:
+                item = self.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self.aborted.is_set():
+                    raise PipelineAborted()
+        self.get_wait += time.perf_counter() - start
+        return item
+
+    def close(self):
+        """Tell the consumer there are no more items"""
+        self.put(_END)
+
+    def __iter__(self):
+        """Yield the items until the queue is closed or the pipeline is aborted"""
+        while True:
+            try:
+                item = self.get()
+            except PipelineAborted:
+                return
+            if item is _END:
+                return
+            yield item
+
+    def report(self):
+        return f'{self.name}: {self.items} items, max depth {self.max_depth}/{self.maxsize}, ' \
+               f'producer waited {self.put_wait:.1f}s, consumer waited {self.get_wait:.1f}s'
+
+
+class Pipeline:
+    """Stages running in threads and connected by StageQueues
+
+    When a stage fails (or calls exit()) the other stages stop at their next queue operation and join() raises the
+    error of the stage again.
+    """
+
+    def __init__(self):
+        self.aborted = threading.Event()
+        self.error = None
+        self.queues = []
+        self.threads = []
+
+    def queue(self, name, maxsize):
+        stage_queue = StageQueue(name, maxsize, self.aborted)
+        self.queues.append(stage_queue)
+        return stage_queue
+
+    def stage(self, name, target):
+        thread = threading.Thread(target=self._run, args=(target,), name=name, daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def _run(self, target):
+        try:
+            target()
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            self.aborted.set()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        return '\n'.join(stage_queue.report() for stage_queue in self.queues)
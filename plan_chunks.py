@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Chunk planner for the parallel analysis scripts
+
+    python3 plan_chunks.py sample <input_xlsx> <sample_xlsx> [sample_size]
+        writes an evenly spread sample of the hiring client list and prints the number of rows of the list
+
+    python3 plan_chunks.py plan <rows> <sample_metrics.json> <cpus> <memory_bytes>
+        prints "<workers> <chunk_size>" computed from the metrics of main.py on the sample (--metrics_file)
+"""
+
+import json
+import math
+import sys
+
+SAMPLE_SIZE = 40
+# work units per worker, more units balance slow rows better but repeat the cbx list load more often
+UNITS_PER_WORKER = 4
+# a chunk should take at least this many times the fixed cost of a container (start and cbx list load)
+MIN_OVERHEAD_RATIO = 5
+# part of the docker memory the containers can use
+MEMORY_SHARE = 0.8
+
+
+def write_sample(input_file, sample_file, sample_size=SAMPLE_SIZE):
+    """Write every n-th row of the list so the sample covers all its parts, return the number of rows"""
+    import pandas as pd
+    df = pd.read_excel(input_file)
+    step = max(1, len(df) // sample_size)
+    df.iloc[::step].head(sample_size).to_excel(sample_file, index=False)
+    return len(df)
+
+
+def plan(rows, metrics, cpus, memory):
+    """Return (workers, chunk_size) for rows hc rows given the metrics of a sample run"""
+    sample_rows = max(1, metrics['hc_rows'])
+    stage_seconds = metrics['stage_seconds']
+    row_seconds = (stage_seconds.get('match', 0.0) + stage_seconds.get('write', 0.0)) / sample_rows
+    # whatever is not per row (cbx list load, hc list read, start of python) is paid once per chunk
+    overhead_seconds = max(0.0, metrics['seconds'] - row_seconds * sample_rows)
+    workers = max(1, cpus)
+    if metrics.get('peak_rss_bytes') and memory:
+        workers = max(1, min(workers, int(memory * MEMORY_SHARE // metrics['peak_rss_bytes'])))
+    workers = min(workers, rows) if rows else 1
+    chunk_size = math.ceil(rows / (workers * UNITS_PER_WORKER)) if rows else 1
+    if row_seconds > 0:
+        chunk_size = max(chunk_size, math.ceil(MIN_OVERHEAD_RATIO * overhead_seconds / row_seconds))
+    # never fewer chunks than workers
+    chunk_size = max(1, min(chunk_size, math.ceil(rows / workers) if rows else 1))
+    print(f'Sample: {row_seconds:.3f}s per row, {overhead_seconds:.1f}s per container, '
+          f'estimated {row_seconds * rows / workers / 60:.1f} minutes with {workers} workers', file=sys.stderr)
+    return workers, chunk_size
+
+
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == 'sample':
+        sample_size = int(sys.argv[4]) if len(sys.argv) > 4 else SAMPLE_SIZE
+        print(write_sample(sys.argv[2], sys.argv[3], sample_size))
+    elif len(sys.argv) == 6 and sys.argv[1] == 'plan':
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            metrics = json.load(f)
+        workers, chunk_size = plan(int(sys.argv[2]), metrics, int(sys.argv[4]), int(sys.argv[5]))
+        print(f'{workers} {chunk_size}')
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
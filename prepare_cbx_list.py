@@ -0,0 +1,61 @@
+import argparse
+from datetime import datetime
+from main import read_cbx_list
+from matching import CBX_ENRICHMENT, CBX_MATCH_COLUMNS, RULE_PROFILES, MatchConfig, Matcher
+from prepared_cbx import write_prepared_cbx_list
+
+# define commandline parser
+parser = argparse.ArgumentParser(
+    description='Read, check and index the CBX list once and write it as a prepared cbx list: a memory-mappable file'
+                ' that main.py reads in place of the csv export without parsing it again, all input/output files'
+                ' must be in the data directory')
+parser.add_argument('cbx_list', help='csv DB export file of business units (see main.py)')
+parser.add_argument('prepared_cbx_list', help='the prepared cbx list to be created')
+
+parser.add_argument('--cbx_list_encoding', dest='cbx_encoding', action='store',
+                    default='utf-8-sig',
+                    help='Encoding for the cbx list (default: utf-8-sig)')
+
+parser.add_argument('--list_separator', dest='list_separator', action='store',
+                    default=';',
+                    help='string separator used for lists (default: ;)')
+
+parser.add_argument('--additional_generic_name_word', dest='additional_generic_name_word', action='store',
+                    default='',
+                    help='list of generic words in company name to ignore separated by the list separator'
+                         ' (default separator is ;), main.py must use the same words')
+
+parser.add_argument('--rule_profile', dest='rule_profile', action='store',
+                    default='standard', choices=sorted(RULE_PROFILES),
+                    help='business rules of the analysis, main.py must use the same profile (default: standard)')
+
+parser.add_argument('--mmap_cbx_list', dest='mmap_cbx_list', action='store_true',
+                    help='memory-map the cbx list while it is prepared (see main.py)')
+
+parser.add_argument('--no_headers', dest='no_headers', action='store_true',
+                    help='to indicate that the cbx list has no headers')
+
+parser.add_argument('--ignore_warnings', dest='ignore_warnings', action='store_true',
+                    help='to ignore data consistency checks and run anyway...')
+
+
+def prepare(args):
+    data_path = './data/'
+    config = MatchConfig(additional_generic_name_word=args.additional_generic_name_word,
+                         list_separator=args.list_separator, ignore_warnings=args.ignore_warnings,
+                         rule_profile=args.rule_profile)
+    print(f'Starting at {datetime.now()}')
+    print(f'Reading CBX list: {args.cbx_list} [{args.cbx_encoding}]')
+    matcher = Matcher(read_cbx_list(args, data_path + args.cbx_list), config)
+    for cbx_id, error in matcher.load_errors:
+        print(f'WARNING: {error} for business unit {cbx_id}')
+    if matcher.load_errors and not args.ignore_warnings:
+        exit(-1)
+    write_prepared_cbx_list(data_path + args.prepared_cbx_list, matcher.cbx_data, matcher.load_errors,
+                            config.cbx_identity(), CBX_MATCH_COLUMNS, CBX_ENRICHMENT)
+    print(f'Prepared {len(matcher.cbx_data)} contractors in {args.prepared_cbx_list}')
+    print(f'Completed at {datetime.now()}')
+
+
+if __name__ == '__main__':
+    prepare(parser.parse_args())
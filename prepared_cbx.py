@@ -0,0 +1,62 @@
+import csv
+import io
+import os
+import pickle
+import struct
+
+from mapped_csv import MappedCsv, MappedRow
+
+PREPARED_MAGIC = b'CBXPREP1'
+PREPARED_FORMAT_VERSION = 1
+# magic followed by the offset of the index
+PREPARED_HEADER = struct.Struct('<8sQ')
+
+
+def is_prepared_cbx_list(path):
+    with open(path, 'rb') as f:
+        return f.read(len(PREPARED_MAGIC)) == PREPARED_MAGIC
+
+
+def write_prepared_cbx_list(path, cbx_rows, load_errors, identity, match_columns, enrichment_column):
+    """Write the business units loaded by a Matcher as a prepared cbx list
+
+    The file holds the full rows as utf-8 csv, read again through a memory map for the reported matches only, and
+    an index of the rows compacted to match_columns with their enrichment. identity is the MatchConfig.cbx_identity
+    the rows were loaded with.
+    """
+    rows = []
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PREPARED_HEADER.pack(PREPARED_MAGIC, 0))
+        for row in cbx_rows:
+            full_row = row.full_row() if isinstance(row, MappedRow) else row[:enrichment_column]
+            line = io.StringIO()
+            csv.writer(line).writerow(full_row)
+            rows.append((f.tell(), [value if column in match_columns or column >= enrichment_column else ''
+                                    for column, value in enumerate(row)]))
+            f.write(line.getvalue().encode('utf-8'))
+        index_offset = f.tell()
+        pickle.dump({'version': PREPARED_FORMAT_VERSION, 'identity': identity, 'rows': rows,
+                     'load_errors': load_errors}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+        f.write(PREPARED_HEADER.pack(PREPARED_MAGIC, index_offset))
+    os.replace(tmp_path, path)
+
+
+class PreparedCbxList:
+    """Business units of a prepared cbx list, memory-mapped so parallel runs on the same file share its pages
+
+    rows are MappedRow of the compacted and enriched business units, ready for Matcher(rows, config,
+    load_errors=load_errors). version and identity must be checked before using them.
+    """
+
+    def __init__(self, path):
+        self.source = MappedCsv(path, 'utf-8')
+        magic, index_offset = PREPARED_HEADER.unpack(self.source.buffer[:PREPARED_HEADER.size])
+        if magic != PREPARED_MAGIC:
+            raise ValueError(f'{path} is not a prepared cbx list')
+        index = pickle.loads(self.source.buffer[index_offset:])
+        self.version = index['version']
+        self.identity = index['identity']
+        self.load_errors = index['load_errors']
+        self.rows = [MappedRow(values, self.source, offset) for offset, values in index['rows']]
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+CACHE_FORMAT_VERSION = 1
+
+
+def file_digest(path, block_size=1 << 20):
+    """Return the sha1 of a file, used as the identity of a CBX snapshot"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Per hc row cache of match candidates, persisted as json between runs
+
+    Entries are only valid for one CBX snapshot and one set of matching parameters (the context),
+    the cache is reset when the context changes. Each entry is the list of
+    (cbx_id, ratio_company, ratio_address, contact_match) candidates found for the row.
+    """
+
+    def __init__(self, path, snapshot_id, parameters, key_fields):
+        self.path = path
+        self.key_fields = key_fields
+        self.context = hashlib.sha1(json.dumps([snapshot_id, parameters], sort_keys=True,
+                                               default=str).encode('utf-8')).hexdigest()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.reset = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored.get('version') == CACHE_FORMAT_VERSION and stored.get('context') == self.context:
+                self.entries = stored.get('entries', {})
+            else:
+                self.reset = True
+
+    def key(self, hc_row):
+        values = [str(hc_row[field]).strip() for field in self.key_fields]
+        return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        candidates = self.entries.get(key)
+        if candidates is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return candidates
+
+    def put(self, key, candidates):
+        self.entries[key] = [list(candidate) for candidate in candidates]
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_FORMAT_VERSION, 'context': self.context, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f'result cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% reused), ' \
+               f'{len(self.entries)} entries stored'
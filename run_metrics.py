@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+METRIC_PREFIX = 'onboarding_analysis_'
+
+# metric name, help text and json key of the values exported in prometheus format
+GAUGES = (
+    ('cbx_rows', 'Business units loaded from the cbx list', 'cbx_rows'),
+    ('hc_rows', 'Hiring client contractors analysed', 'hc_rows'),
+    ('scored_pairs', 'Hiring client contractor and business unit pairs scored', 'scored_pairs'),
+    ('candidate_pairs', 'Scored pairs above the match ratios', 'candidate_pairs'),
+    ('seconds', 'Duration of the run', 'seconds'),
+    ('peak_rss_bytes', 'Peak resident memory of the run', 'peak_rss_bytes'),
+    ('output_bytes', 'Size of the output workbook (or sheet files)', 'output_bytes'),
+)
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def output_bytes(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+class RunMetrics:
+    """Counters and stage durations of an analysis run, written as json and prometheus text files
+
+    Stage durations are summed, stages running in parallel (--pipeline) can add up to more than the run duration.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.values = {}
+        self.stage_seconds = {}
+        self.actions = {}
+        self.search_stats = {}
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def as_dict(self):
+        data = {'started_at': self.started_at.isoformat(timespec='seconds')}
+        data.update(self.values)
+        data['seconds'] = round(time.perf_counter() - self.start, 3)
+        data['stage_seconds'] = {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()}
+        data['actions'] = self.actions
+        data['search_stats'] = self.search_stats
+        data['peak_rss_bytes'] = peak_rss_bytes()
+        return data
+
+    def write(self, path):
+        """Write <path>.json and <path>.prom, path is the metrics file name without extension"""
+        data = self.as_dict()
+        with open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, default=str)
+        lines = []
+        for name, help_text, key in GAUGES:
+            if data.get(key) is None:
+                continue
+            lines.append(f'# HELP {METRIC_PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} gauge')
+            lines.append(f'{METRIC_PREFIX}{name} {data[key]}')
+        for name, help_text, label, values in (
+                ('stage_seconds', 'Duration of each stage of the run', 'stage', data['stage_seconds']),
+                ('action_rows', 'Hiring client contractors per action', 'action', data['actions']),
+                ('search_rows', 'Rows or pairs resolved by each search tier', 'tier', data['search_stats']),
+                ('generic_domain_business_units', 'Business units of the email domains detected as generic',
+                 'domain', data.get('detected_generic_domains', {}))):
+            lines.append(f'# HELP {METRIC_PREFIX}{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} gauge')
+            for key, value in values.items():
+                lines.append(f'{METRIC_PREFIX}{name}{{{label}="{key}"}} {value}')
+        with open(path + '.prom', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
@@ -1,38 +1,102 @@
-# Usage: .\run_parallel_analysis.ps1 <input_xlsx> <chunk_size> <csv_file> <output_file> [--local|--remote]
+# Usage: .\run_parallel_analysis.ps1 <input_xlsx> <chunk_size|auto> <csv_file> <output_file> [--local|--remote] [--max_parallel <n>] [--resume]
 # Ensure Python 3 is installed (user must do this manually)
 # Install required Python packages
 py -3.12 -m pip install --upgrade pip
 py -3.12 -m pip install pandas openpyxl
 
 if ($args.Count -lt 4) {
-    Write-Host "Usage: .\run_parallel_analysis.ps1 <input_xlsx> <chunk_size> <csv_file> <output_file> [--local|--remote]"
+    Write-Host "Usage: .\run_parallel_analysis.ps1 <input_xlsx> <chunk_size|auto> <csv_file> <output_file> [--local|--remote] [--max_parallel <n>] [--resume]"
     exit 1
 }
 
 $input_xlsx = $args[0]
-$chunk_size = [int]$args[1]
+$chunk_size = $args[1]
 $csv_file = $args[2]
 $output_file = $args[3]
 
-# Parse mode from last optional parameter
+# Parse the optional parameters
 $mode = "remote" # default
-if ($args.Count -gt 4) {
-    if ($args[4] -eq "--local") {
+$max_parallel = 0
+$resume = $false
+for ($a = 4; $a -lt $args.Count; $a++) {
+    if ($args[$a] -eq "--local") {
         $mode = "local"
-    } elseif ($args[4] -eq "--remote") {
+    } elseif ($args[$a] -eq "--remote") {
         $mode = "remote"
+    } elseif ($args[$a] -eq "--max_parallel") {
+        $a++
+        $max_parallel = [int]$args[$a]
+    } elseif ($args[$a] -eq "--resume") {
+        $resume = $true
     }
 }
 
+# Build the image once, every chunk runs in a container of the same image
 if ($mode -eq "remote") {
     Write-Host "[INFO] Running in REMOTE mode (GitHub Docker build)"
+    if (-not $env:token) {
+        Write-Host "Error: GITHUB_TOKEN environment variable is not set."
+        exit 1
+    }
+    $image = docker build -t icm -q "https://$($env:token):@github.com/Alcumus/onboarding-analysis-tools.git"
 } else {
     Write-Host "[INFO] Running in LOCAL mode (local Docker image)"
+    Write-Host "Building Docker image..."
+    docker build -t onboarding-analysis-tools .
+    $image = "onboarding-analysis-tools"
+}
+$docker_cpus, $docker_memory = (docker info --format "{{.NCPU}} {{.MemTotal}}") -split ' '
+# each container holds the whole CBX list, by default no more containers than CPUs run at the same time
+$workers = if ($max_parallel -gt 0) { $max_parallel } else { [int]$docker_cpus }
+
+# the run manifest records the input hash, exit status and output of each chunk, --resume reruns only the chunks
+# that failed or did not run as long as the input file, the CBX list and the chunk files are unchanged
+$manifest = "run_manifest.json"
+$resumed = $false
+if ($resume) {
+    $run_plan = py -3.12 chunk_manifest.py check $manifest $input_xlsx $csv_file
+    if ($LASTEXITCODE -eq 0) {
+        $chunk_size, $num_chunks = $run_plan -split ' '
+        $resumed = $true
+        Write-Host "Resuming the run of $manifest ($num_chunks chunks of $chunk_size rows)"
+    } else {
+        Write-Host "Starting a new run"
+    }
+}
+
+# the CBX list is read, checked and indexed once, every container maps the prepared file from the shared volume
+$prepared_cbx = "cbx_list.prepared"
+if (-not $resumed -or -not (Test-Path $prepared_cbx)) {
+    Write-Host "Preparing $csv_file..."
+    docker run --rm -v "$($PWD.Path):/home/script/data" --entrypoint python $image prepare_cbx_list.py `
+        $csv_file $prepared_cbx
+    if ($LASTEXITCODE -ne 0) { exit 1 }
+}
+
+# Step 0 (auto chunk size): time the analysis of a sample of the list against the CBX list, then choose the
+# number of workers and the chunk size from the CPUs and memory available to docker
+if (-not $resumed -and $chunk_size -eq "auto") {
+    $rows = py -3.12 plan_chunks.py sample $input_xlsx sample_chunk.xlsx
+    Write-Host "Timing a sample of $input_xlsx ($rows rows)..."
+    docker run --rm -v "$($PWD.Path):/home/script/data" $image $prepared_cbx sample_chunk.xlsx output_sample_chunk.xlsx `
+        --metrics_file sample_metrics | Out-Null
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "Error: the analysis of the sample failed, give a chunk size instead of auto to skip it."
+        Remove-Item -Force -ErrorAction SilentlyContinue sample_chunk.xlsx, output_sample_chunk.xlsx, sample_metrics.json, sample_metrics.prom
+        exit 1
+    }
+    $workers, $chunk_size = (py -3.12 plan_chunks.py plan $rows sample_metrics.json $workers $docker_memory) -split ' '
+    $workers = [int]$workers
+    Remove-Item -Force -ErrorAction SilentlyContinue sample_chunk.xlsx, output_sample_chunk.xlsx, sample_metrics.json, sample_metrics.prom
+    Write-Host "Using $workers workers and chunks of $chunk_size rows"
 }
+$chunk_size = [int]$chunk_size
 
 # Step 1: Split input file
-Write-Host "Splitting $input_xlsx into chunks of $chunk_size rows..."
-py -3.12 -c "
+if (-not $resumed) {
+    Remove-Item -Force -ErrorAction SilentlyContinue chunk_*.xlsx, output_chunk_*.xlsx
+    Write-Host "Splitting $input_xlsx into chunks of $chunk_size rows..."
+    py -3.12 -c "
 import pandas as pd, sys
 input_file = sys.argv[1]
 chunk_size = int(sys.argv[2])
@@ -49,59 +113,66 @@ with open('num_chunks.txt', 'w') as f:
     f.write(str(num_chunks))
 " $input_xlsx $chunk_size
 
- $num_chunks = Get-Content num_chunks.txt
-Remove-Item num_chunks.txt
+    $num_chunks = Get-Content num_chunks.txt
+    Remove-Item num_chunks.txt
+    py -3.12 chunk_manifest.py create $manifest $input_xlsx $csv_file $chunk_size $num_chunks
+}
 
 # Step 2: Run parallel analysis
-if ($mode -eq "remote") {
-    Write-Host "[INFO] Running in REMOTE mode (GitHub Docker build)"
-    Write-Host "Running parallel analysis for $num_chunks chunks..."
-    if (-not $env:token) {
-        Write-Host "Error: GITHUB_TOKEN environment variable is not set."
-        exit 1
+# chunks are queued and handed out to the workers as they become free so slow chunks don't hold the others
+function Receive-FinishedChunks($jobs) {
+    foreach ($job in @($jobs | Where-Object { $_.State -ne 'Running' })) {
+        Receive-Job -Job $job -ErrorAction SilentlyContinue | Out-Null
+        $seconds = [int]($job.PSEndTime - $job.PSBeginTime).TotalSeconds
+        $exit_code = if ($job.State -eq 'Completed') { 0 } else { 1 }
+        Set-Content -Path "chunk_$($job.Name).exit" -Value "$exit_code $seconds"
+        if ($job.State -eq 'Completed') {
+            Write-Host "Chunk $($job.Name) completed in ${seconds}s"
+        } else {
+            Write-Host "❌ Chunk $($job.Name) failed after ${seconds}s"
+        }
+        Remove-Job -Job $job
     }
-    $current_path = $PWD.Path
-    $jobs = @()
-    for ($i = 1; $i -le $num_chunks; $i++) {
-        Write-Host "Starting chunk $i..."
-        $jobs += Start-Job -ScriptBlock {
-            param($i, $csv_file, $token, $pwd)
-            docker run --rm `
-                -v "${pwd}:/home/script/data" `
-                $(docker build -t icm-$i -q "https://${token}:@github.com/Alcumus/onboarding-analysis-tools.git") `
-                $csv_file "chunk_${i}.xlsx" "output_chunk_${i}.xlsx"
-        } -ArgumentList $i, $csv_file, $env:token, $current_path
-    }
-    Write-Host "Waiting for all jobs to complete..."
-    $jobs | Wait-Job | Receive-Job
-    $jobs | Remove-Job
-} else {
-    Write-Host "[INFO] Running in LOCAL mode (local Docker image)"
-    Write-Host "Building Docker image..."
-    docker build -t onboarding-analysis-tools .
-    Write-Host "Running parallel analysis for $num_chunks chunks..."
-    $current_path = $PWD.Path
-    $jobs = @()
-    for ($i = 1; $i -le $num_chunks; $i++) {
-        Write-Host "Starting chunk $i..."
-        $jobs += Start-Job -ScriptBlock {
-            param($i, $csv_file, $pwd)
-            docker run --rm `
-                -v "${pwd}:/home/script/data" `
-                onboarding-analysis-tools $csv_file "chunk_${i}.xlsx" "output_chunk_${i}.xlsx"
-        } -ArgumentList $i, $csv_file, $current_path
+    return @($jobs | Where-Object { $_.State -eq 'Running' })
+}
+
+$pending = @(py -3.12 chunk_manifest.py pending $manifest)
+Write-Host "Running parallel analysis for $($pending.Count) of $num_chunks chunks, $workers at a time..."
+$current_path = $PWD.Path
+$jobs = @()
+foreach ($i in $pending) {
+    Remove-Item -Force -ErrorAction SilentlyContinue "output_chunk_${i}.xlsx"
+    while ($jobs.Count -ge $workers) {
+        Wait-Job -Job $jobs -Any | Out-Null
+        $jobs = @(Receive-FinishedChunks $jobs)
     }
-    Write-Host "Waiting for all jobs to complete..."
-    $jobs | Wait-Job | Receive-Job
-    $jobs | Remove-Job
+    $jobs += Start-Job -Name $i -ScriptBlock {
+        param($i, $prepared_cbx, $image, $pwd)
+        docker run --rm `
+            -v "${pwd}:/home/script/data" `
+            $image $prepared_cbx "chunk_${i}.xlsx" "output_chunk_${i}.xlsx"
+        if ($LASTEXITCODE -ne 0) { throw "docker run exited with $LASTEXITCODE" }
+    } -ArgumentList $i, $prepared_cbx, $image, $current_path
+}
+while ($jobs.Count -gt 0) {
+    Wait-Job -Job $jobs -Any | Out-Null
+    $jobs = @(Receive-FinishedChunks $jobs)
+}
+py -3.12 chunk_manifest.py update $manifest
+py -3.12 chunk_manifest.py verify $manifest
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "❌ Some chunks did not complete, fix the problem and rerun with --resume to run only those chunks"
+    exit 1
 }
 Write-Host "✅ All containers completed!"
 
 # Step 3: Merge results
 Write-Host "Merging chunk outputs into output_remote_master.xlsx..."
 py -3.12 -c "
-import pandas as pd, glob
-chunks = sorted(glob.glob('output_chunk_*.xlsx'))
+import pandas as pd, json, sys
+# merge the outputs of the manifest in chunk order, every one was verified complete
+with open(sys.argv[1], 'r', encoding='utf-8') as f:
+    chunks = [chunk['output'] for chunk in json.load(f)['chunks']]
 sheet_names = [
     'all', 'onboarding', 'association_fee', 're_onboarding', 'subscription_upgrade',
     'ambiguous_onboarding', 'restore_suspended', 'activation_link', 'already_qualified',
@@ -112,12 +183,9 @@ merged_sheets = {}
 for sheet_name in sheet_names:
     sheet_dfs = []
     for chunk_file in chunks:
-        try:
-            df = pd.read_excel(chunk_file, sheet_name=sheet_name)
-            if len(df) > 0:
-                sheet_dfs.append(df)
-        except Exception:
-            pass
+        df = pd.read_excel(chunk_file, sheet_name=sheet_name)
+        if len(df) > 0:
+            sheet_dfs.append(df)
     if sheet_dfs:
         merged_sheets[sheet_name] = pd.concat(sheet_dfs, ignore_index=True)
     else:
@@ -125,7 +193,7 @@ for sheet_name in sheet_names:
 with pd.ExcelWriter('output_remote_master.xlsx') as writer:
     for sheet_name in sheet_names:
         merged_sheets[sheet_name].to_excel(writer, sheet_name=sheet_name, index=False)
-"
+" $manifest
 
 # Step 4: Format output
 Write-Host "Formatting merged output..."
@@ -137,4 +205,6 @@ Write-Host "Cleaning up intermediate files..."
 Remove-Item -Force -ErrorAction SilentlyContinue chunk_*.xlsx
 Remove-Item -Force -ErrorAction SilentlyContinue output_chunk_*.xlsx
 Remove-Item -Force -ErrorAction SilentlyContinue output_remote_master.xlsx
+Remove-Item -Force -ErrorAction SilentlyContinue $manifest
+Remove-Item -Force -ErrorAction SilentlyContinue $prepared_cbx
 Write-Host "Cleanup complete. Only $output_file retained."
@@ -1,5 +1,5 @@
 #!/bin/bash
-# Usage: ./run_parallel_analysis.sh <input_xlsx> <chunk_size> <csv_file> <output_file>
+# Usage: ./run_parallel_analysis.sh <input_xlsx> <chunk_size|auto> <csv_file> <output_file> [--local|--remote] [--max_parallel <n>] [--resume]
 # Ensure Python 3 is installed (user must do this manually)
 # Install required Python packages
 python3 -m pip install --upgrade pip
@@ -12,22 +12,86 @@ csv_file="$3"
 output_file="$4"
 
 mode="remote" # default
-if [[ "$5" == "--local" ]]; then
-  mode="local"
+max_parallel=""
+resume="false"
+shift 4 || true
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --local) mode="local" ;;
+    --remote) mode="remote" ;;
+    --max_parallel) max_parallel="$2"; shift ;;
+    --resume) resume="true" ;;
+  esac
   shift
-elif [[ "$5" == "--remote" ]]; then
-  mode="remote"
-  shift
-fi
+done
 
 if [[ -z "$input_xlsx" || -z "$chunk_size" || -z "$csv_file" || -z "$output_file" ]]; then
-  echo "Usage: $0 <input_xlsx> <chunk_size> <csv_file> <output_file> [--local|--remote] "
+  echo "Usage: $0 <input_xlsx> <chunk_size|auto> <csv_file> <output_file> [--local|--remote] [--max_parallel <n>] [--resume]"
   exit 1
 fi
 
+# Build the image once, every chunk runs in a container of the same image
+if [[ "$mode" == "remote" ]]; then
+  echo "[INFO] Running in REMOTE mode (GitHub Docker build)"
+  if [[ -z "$token" ]]; then
+      echo "Error: GITHUB_TOKEN environment variable is not set."
+      exit 1
+  fi
+  image=$(docker build -t icm -q https://${token}:@github.com/Alcumus/onboarding-analysis-tools.git)
+else
+  echo "[INFO] Running in LOCAL mode (local Docker image)"
+  echo "Building Docker image..."
+  docker build --no-cache -t onboarding-analysis-tools .
+  image="onboarding-analysis-tools"
+fi
+read docker_cpus docker_memory <<< "$(docker info --format '{{.NCPU}} {{.MemTotal}}')"
+# each container holds the whole CBX list, by default no more containers than CPUs run at the same time
+workers="${max_parallel:-$docker_cpus}"
+
+# the run manifest records the input hash, exit status and output of each chunk, --resume reruns only the chunks
+# that failed or did not run as long as the input file, the CBX list and the chunk files are unchanged
+manifest="run_manifest.json"
+resumed="false"
+if [[ "$resume" == "true" ]]; then
+  if run_plan=$(python3 chunk_manifest.py check "$manifest" "$input_xlsx" "$csv_file"); then
+    read chunk_size num_chunks <<< "$run_plan"
+    resumed="true"
+    echo "Resuming the run of $manifest ($num_chunks chunks of $chunk_size rows)"
+  else
+    echo "Starting a new run"
+  fi
+fi
+
+# the CBX list is read, checked and indexed once, every container maps the prepared file from the shared volume
+prepared_cbx="cbx_list.prepared"
+if [[ "$resumed" == "false" || ! -f "$prepared_cbx" ]]; then
+  echo "Preparing $csv_file..."
+  docker run --rm -v "$(pwd)":/home/script/data --entrypoint python "$image" prepare_cbx_list.py \
+      "$csv_file" "$prepared_cbx"
+fi
+
+# Step 0 (auto chunk size): time the analysis of a sample of the list against the CBX list, then choose the
+# number of workers and the chunk size from the CPUs and memory available to docker
+if [[ "$resumed" == "false" && "$chunk_size" == "auto" ]]; then
+  rows=$(python3 plan_chunks.py sample "$input_xlsx" sample_chunk.xlsx)
+  echo "Timing a sample of $input_xlsx ($rows rows)..."
+  # only the analysis progress is hidden, errors are printed
+  if ! docker run --rm -v $(pwd):/home/script/data "$image" "$prepared_cbx" sample_chunk.xlsx output_sample_chunk.xlsx \
+      --metrics_file sample_metrics > /dev/null; then
+    echo "Error: the analysis of the sample failed, give a chunk size instead of auto to skip it."
+    rm -f sample_chunk.xlsx output_sample_chunk.xlsx sample_metrics.json sample_metrics.prom
+    exit 1
+  fi
+  read workers chunk_size <<< "$(python3 plan_chunks.py plan "$rows" sample_metrics.json "$workers" "$docker_memory")"
+  rm -f sample_chunk.xlsx output_sample_chunk.xlsx sample_metrics.json sample_metrics.prom
+  echo "Using $workers workers and chunks of $chunk_size rows"
+fi
+
 # Step 1: Split input file
-echo "Splitting $input_xlsx into chunks of $chunk_size rows..."
-python3 -c "
+if [[ "$resumed" == "false" ]]; then
+  rm -f chunk_*.xlsx output_chunk_*.xlsx chunk_*.exit chunk_*.log
+  echo "Splitting $input_xlsx into chunks of $chunk_size rows..."
+  python3 -c "
 import pandas as pd
 import sys
 import os
@@ -93,44 +157,47 @@ with open('num_chunks.txt', 'w') as f:
 print('✅ Wrote num_chunks.txt')
 " "$input_xlsx" "$chunk_size"
 
-num_chunks=$(cat num_chunks.txt)
-rm num_chunks.txt
+  num_chunks=$(cat num_chunks.txt)
+  rm num_chunks.txt
+  python3 chunk_manifest.py create "$manifest" "$input_xlsx" "$csv_file" "$chunk_size" "$num_chunks"
+fi
 
 # Step 2: Run parallel analysis
-if [[ "$mode" == "remote" ]]; then
-    echo "[INFO] Running in REMOTE mode (GitHub Docker build)"
-    echo "Running parallel analysis for $num_chunks chunks..."
-  if [[ -z "$token" ]]; then
-      echo "Error: GITHUB_TOKEN environment variable is not set."
-      exit 1
-  fi
-  for i in $(seq 1 $num_chunks); do
-      docker run --rm \
-          -v $(pwd):/home/script/data \
-          $(docker build -t icm-$i -q https://${token}:@github.com/Alcumus/onboarding-analysis-tools.git) \
-          "$csv_file" "chunk_${i}.xlsx" "output_chunk_${i}.xlsx" &
-  done
-else
-    echo "[INFO] Running in LOCAL mode (local Docker image)"
-    echo "Building Docker image..."
-    docker build --no-cache -t onboarding-analysis-tools .
-    echo "Running parallel analysis for $num_chunks chunks..."
-    for i in $(seq 1 $num_chunks); do
-            docker run --rm \
-                    -v $(pwd):/home/script/data \
-                    onboarding-analysis-tools "$csv_file" "chunk_${i}.xlsx" "output_chunk_${i}.xlsx" &
-    done
+# chunks are queued and handed out to the workers as they become free so slow chunks don't hold the others
+run_chunk() {
+    local start=$SECONDS status=0
+    rm -f "output_chunk_$1.xlsx"
+    docker run --rm -v "$(pwd)":/home/script/data "$image" "$prepared_cbx" "chunk_$1.xlsx" "output_chunk_$1.xlsx" \
+        > "chunk_$1.log" 2>&1 || status=$?
+    echo "$status $((SECONDS - start))" > "chunk_$1.exit"
+    if [[ $status -eq 0 ]]; then
+        echo "Chunk $1 completed in $((SECONDS - start))s"
+        rm -f "chunk_$1.log"
+    else
+        echo "❌ Chunk $1 failed after $((SECONDS - start))s, see chunk_$1.log"
+    fi
+}
+export -f run_chunk
+export image prepared_cbx
+pending=$(python3 chunk_manifest.py pending "$manifest")
+echo "Running parallel analysis for $(echo $pending | wc -w) of $num_chunks chunks, $workers at a time..."
+echo "$pending" | xargs -P "$workers" -I{} bash -c 'run_chunk {}'
+python3 chunk_manifest.py update "$manifest"
+if ! python3 chunk_manifest.py verify "$manifest"; then
+  echo "❌ Some chunks did not complete, fix the problem and rerun with --resume to run only those chunks"
+  exit 1
 fi
-wait
 echo "✅ All containers completed!"
 
 # Step 3: Merge results
 echo "Merging chunk outputs into output_remote_master.xlsx..."
-python3 << 'PYEOF'
-import pandas as pd, glob, os
+python3 - "$manifest" << 'PYEOF'
+import pandas as pd, json, os, sys
 output_dir = os.getcwd()
 print(f'Working directory: {output_dir}')
-chunks = sorted(glob.glob(os.path.join(output_dir, 'output_chunk_*.xlsx')))
+# merge the outputs of the manifest in chunk order, every one was verified complete
+with open(sys.argv[1], 'r', encoding='utf-8') as f:
+    chunks = [os.path.join(output_dir, chunk['output']) for chunk in json.load(f)['chunks']]
 print(f'Found {len(chunks)} chunk files to merge')
 sheet_names = [
     'all', 'onboarding', 'association_fee', 're_onboarding', 'subscription_upgrade',
@@ -142,12 +209,9 @@ merged_sheets = {}
 for sheet_name in sheet_names:
     sheet_dfs = []
     for chunk_file in chunks:
-        try:
-            df = pd.read_excel(chunk_file, sheet_name=sheet_name)
-            if len(df) > 0:
-                sheet_dfs.append(df)
-        except Exception:
-            pass
+        df = pd.read_excel(chunk_file, sheet_name=sheet_name)
+        if len(df) > 0:
+            sheet_dfs.append(df)
     if sheet_dfs:
         merged_sheets[sheet_name] = pd.concat(sheet_dfs, ignore_index=True)
     else:
@@ -167,4 +231,6 @@ echo "Cleaning up intermediate files..."
 rm -f chunk_*.xlsx
 rm -f output_chunk_*.xlsx
 rm -f output_remote_master.xlsx
+rm -f "$manifest"
+rm -f "$prepared_cbx"
 echo "Cleanup complete. Only $output_file retained."
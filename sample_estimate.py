@@ -0,0 +1,76 @@
+import math
+import random
+
+# normal quantile of the 95% confidence intervals
+Z_95 = 1.96
+
+
+def allocate(stratum_sizes, size):
+    """Return the number of rows to sample in each stratum for a sample of size rows
+
+    Rows are allocated in proportion to the stratum sizes, the rows left by the rounding go to the strata without
+    any row first, then to the largest remainders.
+    """
+    total = sum(stratum_sizes.values())
+    if size >= total:
+        return dict(stratum_sizes)
+    quotas = {key: size * count / total for key, count in stratum_sizes.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+    remaining = size - sum(allocation.values())
+    for key in sorted(stratum_sizes, key=lambda x: (allocation[x] > 0, int(quotas[x]) - quotas[x])):
+        if remaining == 0:
+            break
+        if allocation[key] < stratum_sizes[key]:
+            allocation[key] += 1
+            remaining -= 1
+    return allocation
+
+
+def stratified_sample(strata, size, seed=0):
+    """Return a stratified random sample of size rows, strata maps each stratum to the indexes of its rows
+
+    The sample maps each stratum to its sampled indexes, strata without sampled rows are not in it.
+    """
+    rng = random.Random(seed)
+    allocation = allocate({key: len(indexes) for key, indexes in strata.items()}, size)
+    return {key: sorted(rng.sample(indexes, allocation[key])) for key, indexes in strata.items() if allocation[key]}
+
+
+def estimate_counts(stratum_sizes, sample_values, categories):
+    """Estimate the number of rows of each category in the whole list from the values of a stratified sample
+
+    sample_values maps each sampled stratum to the values of its sampled rows. Return for each category the number
+    of sampled rows, the estimated number of rows and its 95% confidence interval (low, high). Strata without
+    sampled rows are represented by the sampled ones.
+    """
+    total = sum(stratum_sizes.values())
+    sampled_total = sum(stratum_sizes[key] for key in sample_values)
+    estimates = {}
+    for category in categories:
+        proportion = variance = 0.0
+        sample_count = 0
+        for key, values in sample_values.items():
+            n, size = len(values), stratum_sizes[key]
+            count = values.count(category)
+            weight = size / sampled_total
+            p = count / n
+            sample_count += count
+            proportion += weight * p
+            # a category never (or always) seen in a stratum would have no uncertainty, its variance is computed with
+            # half a row more of each kind; finite population correction, a fully sampled stratum adds none
+            p_variance = (count + 0.5) / (n + 1)
+            variance += weight ** 2 * (1 - n / size) * p_variance * (1 - p_variance) / max(1, n - 1)
+        margin = Z_95 * math.sqrt(variance)
+        estimates[category] = (sample_count, round(total * proportion),
+                               max(0, round(total * (proportion - margin))),
+                               min(total, round(total * (proportion + margin))))
+    return estimates
+
+
+def project_seconds(stratum_sizes, sample_seconds):
+    """Return the seconds needed for all the rows given the seconds of the sampled rows of each stratum, strata
+    without sampled rows take the mean of all the sampled rows"""
+    all_seconds = [seconds for values in sample_seconds.values() for seconds in values]
+    mean = sum(all_seconds) / len(all_seconds) if all_seconds else 0.0
+    return sum(size * (sum(sample_seconds[key]) / len(sample_seconds[key]) if sample_seconds.get(key) else mean)
+               for key, size in stratum_sizes.items())
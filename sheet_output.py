@@ -0,0 +1,163 @@
+import csv
+import importlib.util
+import json
+import os
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet', 'jsonl')
+
+# order of the sheets of the analysis workbook, used to rebuild it from a sheet directory
+SHEET_TITLES = ('all', 'onboarding', 'association_fee', 're_onboarding', 'subscription_upgrade',
+                'ambiguous_onboarding', 'restore_suspended', 'activation_link', 'already_qualified',
+                'add_questionnaire', 'missing_info', 'follow_up_qualification', 'Data to import',
+                'Existing Contractors', 'Data for HS')
+
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def column_names(header_row):
+    """Return unique column names for a header row, empty or repeated headers get a column_<n> name"""
+    names = []
+    for index, header in enumerate(header_row):
+        name = str(header) if header not in (None, '') else f'column_{index + 1}'
+        if name in names:
+            name = f'{name}_{index + 1}'
+        names.append(name)
+    return names
+
+
+class TableSheet:
+    """Worksheet replacement keeping the cell values only, rows and columns start at 1 like openpyxl"""
+
+    def __init__(self, title):
+        self.title = title
+        self.cells = {}
+        self.max_row = 1
+        self.max_column = 1
+
+    def cell(self, row, column, value=None):
+        self.cells.setdefault(row, {})[column] = value
+        self.max_row = max(self.max_row, row)
+        self.max_column = max(self.max_column, column)
+
+    def row_values(self, row):
+        values = self.cells.get(row, {})
+        return [values.get(column) for column in range(1, self.max_column + 1)]
+
+    def header(self):
+        return self.row_values(1)
+
+    def rows(self):
+        """Yield the data rows (below the header row)"""
+        for row in range(2, self.max_row + 1):
+            yield self.row_values(row)
+
+
+class TableOutput:
+    """Workbook replacement writing each sheet as a csv, parquet or json lines file of a directory
+
+    The sheets are filled with the same cell() calls as an openpyxl workbook so the column layouts are identical,
+    save() writes <directory>/<sheet title>.<format>.
+    """
+
+    def __init__(self, output_format):
+        self.output_format = output_format
+        self.active = TableSheet('Sheet')
+        self.worksheets = [self.active]
+
+    def create_sheet(self, title):
+        sheet = TableSheet(title)
+        self.worksheets.append(sheet)
+        return sheet
+
+    def save(self, filename):
+        os.makedirs(filename, exist_ok=True)
+        for sheet in self.worksheets:
+            path = os.path.join(filename, f'{sheet.title}.{self.output_format}')
+            if self.output_format == 'csv':
+                write_csv(sheet, path)
+            elif self.output_format == 'jsonl':
+                write_jsonl(sheet, path)
+            elif self.output_format == 'parquet':
+                write_parquet(sheet, path)
+            else:
+                raise ValueError(f'unknown output format {self.output_format}')
+
+
+def text(value):
+    return '' if value is None else value
+
+
+def write_csv(sheet, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([text(x) for x in sheet.header()])
+        for row in sheet.rows():
+            writer.writerow([text(x) for x in row])
+
+
+def write_jsonl(sheet, path):
+    """Write the header row as a json array on the first line, then one json object per data row, so the columns
+    of a sheet without rows are kept"""
+    header = sheet.header()
+    names = column_names(header)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, default=str, ensure_ascii=False))
+        f.write('\n')
+        for row in sheet.rows():
+            f.write(json.dumps(dict(zip(names, row)), default=str, ensure_ascii=False))
+            f.write('\n')
+
+
+def write_parquet(sheet, path):
+    """Write the sheet as a parquet file, every column is stored as text since the sheets mix value types"""
+    import pyarrow
+    import pyarrow.parquet
+    rows = list(sheet.rows())
+    columns = [[None if row[i] is None else str(row[i]) for row in rows] for i in range(sheet.max_column)]
+    table = pyarrow.Table.from_arrays([pyarrow.array(column, type=pyarrow.string()) for column in columns],
+                                      names=column_names(sheet.header()))
+    pyarrow.parquet.write_table(table, path)
+
+
+def read_sheet(path):
+    """Return the header and the data rows of a sheet file written by TableOutput"""
+    if path.endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = [[x if x != '' else None for x in row] for row in csv.reader(f)]
+        return (rows[0], rows[1:]) if rows else ([], [])
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if records and isinstance(records[0], list):
+            return records[0], [list(record.values()) for record in records[1:]]
+        # files without the header line
+        header = list(records[0].keys()) if records else []
+        return header, [list(record.values()) for record in records]
+    if path.endswith('.parquet'):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path)
+        columns = [table.column(i).to_pylist() for i in range(table.num_columns)]
+        return table.column_names, [list(row) for row in zip(*columns)]
+    raise ValueError(f'unknown sheet file {path}')
+
+
+def load_sheet_directory(directory, workbook):
+    """Fill an empty openpyxl workbook with the sheet files of a TableOutput directory"""
+    files = {os.path.splitext(name)[0]: os.path.join(directory, name) for name in os.listdir(directory)
+             if os.path.splitext(name)[1] in ('.csv', '.jsonl', '.parquet')}
+    titles = [title for title in SHEET_TITLES if title in files]
+    titles.extend(sorted(title for title in files if title not in SHEET_TITLES))
+    workbook.remove(workbook.active)
+    for title in titles:
+        header, rows = read_sheet(files[title])
+        sheet = workbook.create_sheet(title=title)
+        for column, value in enumerate(header):
+            if value is not None and not str(value).startswith('column_'):
+                sheet.cell(1, column + 1, value)
+        for index, row in enumerate(rows):
+            for column, value in enumerate(row):
+                if value is not None:
+                    sheet.cell(index + 2, column + 1, value)
+    return workbook
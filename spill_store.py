@@ -0,0 +1,234 @@
+import itertools
+import os
+import pickle
+import tempfile
+import warnings
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+from run_metrics import peak_rss_bytes
+from sheet_output import TableOutput
+
+# the memory used by the process is checked every SPILL_CHECK_ROWS rows added to the stores of a budget
+SPILL_CHECK_ROWS = 100
+
+
+def current_rss_bytes():
+    """Return the resident memory of the process, its peak when the current one is not available (not linux)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+class MemoryBudget:
+    """Resident memory allowed to the process (--max_memory), all the stores of the budget spill their rows to disk
+    when it is exceeded"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.stores = []
+        self.added_rows = 0
+        self.spilled_rows = 0
+
+    def exceeded(self):
+        rss = current_rss_bytes()
+        return rss is not None and rss > self.max_bytes
+
+    def row_added(self):
+        self.added_rows += 1
+        if self.added_rows % SPILL_CHECK_ROWS == 0:
+            self.check()
+
+    def check(self):
+        """Spill the rows of every store if the process uses more than the budget"""
+        if self.exceeded():
+            for store in self.stores:
+                store.spill()
+
+
+class SpillList:
+    """Append only list of rows kept in memory until the budget is exceeded, they are then moved to a temporary file
+
+    The list can be iterated many times, the rows on disk are read back (as copies) before the rows in memory.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.rows = []
+        self.file = None
+        self.offsets = []
+        self.count = 0
+        budget.stores.append(self)
+
+    def append(self, row):
+        self.rows.append(row)
+        self.count += 1
+        self.budget.row_added()
+
+    def spill(self):
+        if not self.rows:
+            return
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix='spill_')
+        self.file.seek(0, os.SEEK_END)
+        self.offsets.append(self.file.tell())
+        pickle.dump(self.rows, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.budget.spilled_rows += len(self.rows)
+        self.rows = []
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for offset in self.offsets:
+            # seek before each batch so the list can be iterated by more than one loop at a time
+            self.file.seek(offset)
+            yield from pickle.load(self.file)
+        yield from self.rows
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def consume(rows):
+    """Yield the rows of a list and remove them from it, so they are only kept by the stores they are added to"""
+    rows.reverse()
+    while rows:
+        yield rows.pop()
+
+
+class SpilledSheet:
+    """TableSheet replacement for sheets filled row after row (any column order within a row), the finished rows are
+    kept in a SpillList"""
+
+    def __init__(self, title, budget):
+        self.title = title
+        self.stored = SpillList(budget)
+        self.row = 0
+        self.values = {}
+        self.max_row = 1
+        self.max_column = 1
+
+    def cell(self, row, column, value=None):
+        if row != self.row:
+            if row < self.row:
+                raise ValueError(f'row {row} of the {self.title} sheet is written after row {self.row}')
+            self.flush()
+            self.row = row
+        self.values[column] = value
+        self.max_row = max(self.max_row, row)
+        self.max_column = max(self.max_column, column)
+
+    def flush(self):
+        if self.values:
+            self.stored.append((self.row, self.values))
+            self.values = {}
+
+    def all_rows(self):
+        """Yield the values of every row from the first one, the rows never written are empty"""
+        self.flush()
+        next_row = 1
+        for row, values in self.stored:
+            for _ in range(next_row, row):
+                yield [None] * self.max_column
+            yield [values.get(column) for column in range(1, self.max_column + 1)]
+            next_row = row + 1
+        for _ in range(next_row, self.max_row + 1):
+            yield [None] * self.max_column
+
+    def header(self):
+        return next(self.all_rows())
+
+    def rows(self):
+        """Yield the data rows (below the header row)"""
+        return itertools.islice(self.all_rows(), 1, None)
+
+
+class SpilledOutput(TableOutput):
+    """TableOutput whose sheets keep their finished rows on disk past the memory budget
+
+    save() writes the csv, parquet or json lines sheet files, the xlsx workbook is written by write_streamed_xlsx.
+    """
+
+    def __init__(self, output_format, budget):
+        self.output_format = output_format
+        self.budget = budget
+        self.active = SpilledSheet('Sheet', budget)
+        self.worksheets = [self.active]
+
+    def create_sheet(self, title):
+        sheet = SpilledSheet(title, self.budget)
+        self.worksheets.append(sheet)
+        return sheet
+
+    def close(self):
+        for sheet in self.worksheets:
+            sheet.stored.close()
+
+
+def write_streamed_xlsx(sheets, filename, wrapped_columns, wrapped_rows, unwrapped_sheets=()):
+    """Write the sheets in a write-only workbook with the formatting of the analysis workbook
+
+    The sheets are read twice from their stores, once for the column widths and once to write the rows, so the
+    workbook is never held in memory. wrapped_columns (column numbers) are 150 wide with wrapped text on the rows 2 to
+    wrapped_rows of each sheet, except the unwrapped_sheets.
+    """
+    # the widths grow from one sheet to the next, like the in-memory formatting
+    dims = {}
+    widths = []
+    for sheet in sheets:
+        for values in sheet.all_rows():
+            for column, value in enumerate(values, 1):
+                if value:
+                    letter = get_column_letter(column)
+                    dims[letter] = max(dims.get(letter, 0), len(str(value)))
+        widths.append(dict(dims))
+    style = TableStyleInfo(name="TableStyleMedium2", showFirstColumn=False,
+                           showLastColumn=False, showRowStripes=True, showColumnStripes=False)
+    wrap = Alignment(wrapText=True)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet, sheet_widths in zip(sheets, widths):
+        ws = workbook.create_sheet(title=sheet.title)
+        wrapped = () if sheet in unwrapped_sheets else wrapped_columns
+        for letter, width in sheet_widths.items():
+            ws.column_dimensions[letter].width = width
+        for column in wrapped:
+            ws.column_dimensions[get_column_letter(column)].width = 150
+        header = sheet.header()
+        for row, values in enumerate(sheet.all_rows(), 1):
+            if wrapped and 2 <= row <= wrapped_rows:
+                values = wrap_cells(ws, values, wrapped, wrap)
+            ws.append(values)
+        if wrapped:
+            # the in-memory formatting creates the wrapped cells down to wrapped_rows on the shorter sheets too
+            for _ in range(max(sheet.max_row + 1, 2), wrapped_rows + 1):
+                ws.append(wrap_cells(ws, [], wrapped, wrap))
+        tab = Table(displayName=sheet.title.replace(" ", "_"),
+                    ref=f'A1:{get_column_letter(sheet.max_column)}{sheet.max_row + 1}')
+        tab.tableStyleInfo = style
+        # write-only sheets can not name the table columns from their header cells
+        tab.tableColumns = [TableColumn(id=column, name=str(header[column - 1]))
+                            for column in range(1, sheet.max_column + 1)]
+        tab.autoFilter = AutoFilter(ref=tab.ref)
+        with warnings.catch_warnings():
+            # openpyxl warns about every write-only table, its columns are set above
+            warnings.simplefilter('ignore', UserWarning)
+            ws.add_table(tab)
+    workbook.save(filename)
+
+
+def wrap_cells(ws, values, wrapped_columns, alignment):
+    values = list(values) + [None] * (max(wrapped_columns) - len(values))
+    for column in wrapped_columns:
+        cell = WriteOnlyCell(ws, values[column - 1])
+        cell.alignment = alignment
+        values[column - 1] = cell
+    return values
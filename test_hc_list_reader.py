@@ -0,0 +1,67 @@
+import csv
+
+import openpyxl
+
+import main
+from matching import HC_AMBIGUOUS, HC_ASSESSMENT_LEVEL, HC_HEADER_LENGTH, HC_IS_ASSOCIATION_FEE, cbx_headers, \
+    hiring_client_headers
+
+
+def cbx_row(cbx_id, name, email, assessment_level):
+    row = dict.fromkeys(cbx_headers, '')
+    row.update({'id': cbx_id, 'name_en': name, 'address': f'{cbx_id} Main Street', 'city': 'Montreal',
+                'state': 'QC', 'country': 'CA', 'postal_code': f'H{cbx_id}X 1Y1', 'first_name': 'John',
+                'last_name': 'Doe', 'email': email, 'cbx_expiration_date': '16/08/2027',
+                'registration_code': 'Active', 'suspended': 'false', 'access_modes': 'Contractor',
+                'code': 'standard', 'subscription_price_cad': '900', 'employee_price_cad': '0',
+                'subscription_price_usd': '0', 'employee_price_usd': '0', 'assessment_level': assessment_level,
+                'new_product': 'false'})
+    return [row[header] for header in cbx_headers]
+
+
+def hc_row(cbx_id, name, email, ambiguous, association_fee, assessment_level):
+    row = [''] * HC_HEADER_LENGTH
+    row[:11] = [name, 'Jane', 'Roe', email, '514-555-1234', 'en', f'{cbx_id} Main St', 'Montreal', 'QC', 'CA',
+                f'H{cbx_id}X 1Y1']
+    row[17] = 'en'
+    row[26] = 'Acme Corp'
+    row[30] = 'CAD'
+    row[HC_AMBIGUOUS] = ambiguous
+    row[HC_IS_ASSOCIATION_FEE] = association_fee
+    row[HC_ASSESSMENT_LEVEL] = assessment_level
+    return row
+
+
+def analysis_columns(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [row[HC_HEADER_LENGTH:] for row in csv.reader(f)]
+
+
+def test_csv_hc_list_is_analysed_like_xlsx(tmp_path, monkeypatch):
+    """The text values of a csv hc list (booleans, numbers) give the same analysis as the typed cells of a workbook"""
+    data = tmp_path / 'data'
+    data.mkdir()
+    with open(data / 'cbx.csv', 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(cbx_headers)
+        writer.writerow(cbx_row('1', 'alpha roofing', 'j1@alpha.com', 'level1'))
+        writer.writerow(cbx_row('2', 'beta plumbing', 'j2@beta.com', 'gold'))
+    typed_rows = [hc_row('1', 'alpha roofing', 'x@alpha.com', False, True, 3),
+                  hc_row('2', 'beta plumbing', 'x@beta.com', True, False, 1),
+                  hc_row('3', 'gamma electric', 'x@gamma.com', False, False, None)]
+    text_rows = [hc_row('1', 'alpha roofing', 'x@alpha.com', 'FALSE', 'TRUE', '3'),
+                 hc_row('2', 'beta plumbing', 'x@beta.com', 'TRUE', 'FALSE', '1'),
+                 hc_row('3', 'gamma electric', 'x@gamma.com', 'FALSE', 'FALSE', '')]
+    wb = openpyxl.Workbook()
+    wb.active.append(hiring_client_headers)
+    for row in typed_rows:
+        wb.active.append(row)
+    wb.save(data / 'hc.xlsx')
+    with open(data / 'hc.csv', 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(hiring_client_headers)
+        writer.writerows(text_rows)
+    monkeypatch.chdir(tmp_path)
+    for hc_list, output in (('hc.xlsx', 'from_xlsx.xlsx'), ('hc.csv', 'from_csv.xlsx')):
+        main.run(main.parser.parse_args(['cbx.csv', hc_list, output, '--output_format', 'csv']))
+    assert analysis_columns(data / 'from_xlsx' / 'all.csv') == analysis_columns(data / 'from_csv' / 'all.csv')